@@ -0,0 +1,57 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+
+def database_sync_to_async(func):
+    """Выполняет синхронную функцию с запросами к базе в пуле потоков.
+
+    В отличие от sync_to_async(thread_sensitive=True), под которым Django
+    3.2 выполняет синхронные представления по очереди в одном потоке,
+    вызовы идут параллельно. Соединения с базой потоков пула закрываются
+    так же, как в конце обычного запроса.
+    """
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+def async_view(view):
+    """Превращает синхронное представление в асинхронное.
+
+    Представление и отрисовка ответа DRF выполняются в пуле потоков, и
+    рабочий процесс ASGI не блокируется на время запросов к базе.
+    """
+    def render(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        return response
+
+    render = database_sync_to_async(render)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await render(request, *args, **kwargs)
+    return wrapper
+
+
+class AsyncViewSetMixin():
+    """Миксин вьюсета, отдающего асинхронные представления в режиме ASGI.
+
+    Включается настройкой ASYNC_VIEWS, которую выставляет foodgram.asgi;
+    при запуске через WSGI представления остаются синхронными.
+    """
+
+    @classmethod
+    def as_view(cls, *args, **kwargs):
+        view = super().as_view(*args, **kwargs)
+        if settings.ASYNC_VIEWS:
+            return async_view(view)
+        return view
@@ -0,0 +1,76 @@
+import copy
+import hashlib
+from typing import Iterable
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from constants import (AUTH_TOKEN_CACHE_SIZE, AUTH_TOKEN_CACHE_TIMEOUT,
+                       AUTH_TOKEN_LOCAL_TIMEOUT)
+from .catalog import is_cache_shared
+from .lru import LRUCache
+
+AUTH_TOKEN_KEY = 'auth_token:{}'
+
+local_tokens = LRUCache(AUTH_TOKEN_CACHE_SIZE, ttl=AUTH_TOKEN_LOCAL_TIMEOUT)
+
+
+def _cache_key(key: str) -> str:
+    return AUTH_TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def invalidate_tokens(keys: Iterable[str]) -> None:
+    """Удаляет токены из кешей сейчас и после фиксации транзакции.
+
+    Повторное удаление после фиксации не даёт параллельному запросу
+    вернуть в кеш пользователя, прочитанного до изменения. Из общего кеша
+    токены удаляются для всех процессов, а LRU-кеши других процессов
+    устаревают не дольше AUTH_TOKEN_LOCAL_TIMEOUT секунд: столько ещё
+    может действовать отозванный токен.
+    """
+    keys = list(keys)
+
+    def invalidate():
+        for key in keys:
+            local_tokens.discard(key)
+        cache.delete_many([_cache_key(key) for key in keys])
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кешированием пользователя.
+
+    Пользователь ищется сначала в LRU-кеше процесса, затем в общем кеше
+    Django и только после этого в базе. Записи живут недолго и
+    сбрасываются при выходе, смене пароля и деактивации пользователя.
+    Если кеш Django хранится в памяти процесса, он не используется:
+    сброс в нём не дошёл бы до других процессов. Тогда остаётся только
+    LRU-кеш с AUTH_TOKEN_LOCAL_TIMEOUT. Каждый запрос получает свою
+    копию пользователя, поэтому изменения request.user не попадают в кеш.
+    """
+
+    def _load_credentials(self, key):
+        if not is_cache_shared():
+            return super().authenticate_credentials(key)
+        credentials = cache.get(_cache_key(key))
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            cache.set(_cache_key(key), credentials, AUTH_TOKEN_CACHE_TIMEOUT)
+        return credentials
+
+    def authenticate_credentials(self, key):
+        credentials = local_tokens.get(key)
+        if credentials is None:
+            credentials = self._load_credentials(key)
+            local_tokens.set(key, credentials)
+        user, token = map(copy.copy, credentials)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        token.user = user
+        return user, token
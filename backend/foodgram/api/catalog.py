@@ -0,0 +1,149 @@
+import gzip
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Iterable
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CATALOG_VERSION_KEY = 'catalog_version:{}'
+
+
+def _now() -> int:
+    return time.time_ns() // 1000
+
+
+def is_cache_shared() -> bool:
+    """Проверяет, что кеш по умолчанию общий для всех процессов."""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def get_versions(keys: Iterable[str]) -> dict[str, int]:
+    """Возвращает версии по ключам кеша одним обращением к кешу.
+
+    Версии хранятся в общем кеше, поэтому все процессы сервера и команды
+    manage.py видят одни и те же значения. Отсутствующую версию
+    записывает первый обратившийся процесс через add, остальные читают
+    его значение. После вытеснения версии зависящие от неё данные просто
+    строятся заново.
+    """
+    keys = list(keys)
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = _now()
+        for key in missing:
+            cache.add(key, now, None)
+        versions.update(cache.get_many(missing))
+        versions.update(
+            (key, now) for key in missing if key not in versions)
+    return versions
+
+
+def bump_version(key: str) -> None:
+    cache.set(key, max(_now(), cache.get(key, 0) + 1), None)
+
+
+def get_catalog_version(catalog: str) -> int:
+    """Возвращает версию справочника — время его изменения в микросекундах.
+
+    Версия хранится в общем кеше Django. Если её там нет, версией
+    становится текущее время, и клиенты один раз получат справочник
+    заново.
+    """
+    key = CATALOG_VERSION_KEY.format(catalog)
+    return get_versions((key,))[key]
+
+
+def bump_catalog_version(catalog: str) -> None:
+    bump_version(CATALOG_VERSION_KEY.format(catalog))
+
+
+def get_catalog_last_modified(catalog: str) -> datetime:
+    return datetime.fromtimestamp(
+        get_catalog_version(catalog) / 1_000_000, tz=timezone.utc)
+
+
+def negotiate_encoding(accept_encoding: str, available: Iterable[str]) -> str:
+    """Выбирает сжатие по заголовку Accept-Encoding с учётом весов q.
+
+    Из доступных сжатий выбирается имеющее наибольший вес, при равных
+    весах — первое в available. Если ни одно не подходит, ответ
+    отдаётся без сжатия.
+    """
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        name, _, value = params.strip().partition('=')
+        try:
+            weight = float(value) if name.strip() == 'q' else 1.0
+        except ValueError:
+            weight = 0.0
+        weights[coding.strip().lower()] = weight
+    best, best_weight = 'identity', 0.0
+    for coding in available:
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+class CatalogSnapshot():
+    """Справочник целиком, заранее отрендеренный в JSON и сжатый.
+
+    Тело ответа строится один раз на версию справочника и хранится в
+    памяти процесса вместе с вариантами gzip и br (если установлен пакет
+    brotli). После изменения справочника снимок перестраивается при
+    следующем обращении.
+    """
+
+    def __init__(self, catalog: str, get_data: Callable[[], list]):
+        self.catalog = catalog
+        self._get_data = get_data
+        self._lock = threading.Lock()
+        self._version = None
+        self._bodies = {}
+
+    def _build(self, version):
+        body = JSONRenderer().render(self._get_data())
+        bodies = {}
+        if brotli is not None:
+            bodies['br'] = brotli.compress(body)
+        bodies['gzip'] = gzip.compress(body, mtime=0)
+        bodies['identity'] = body
+        self._bodies = bodies
+        self._version = version
+
+    def get_bodies(self) -> dict[str, bytes]:
+        """Возвращает тела ответа по сжатиям, от лучшего к худшему."""
+        version = get_catalog_version(self.catalog)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build(version)
+        return self._bodies
+
+    def negotiate(self, request) -> str:
+        """Возвращает сжатие ответа на запрос; оно входит в ETag."""
+        return negotiate_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''),
+            [coding for coding in self.get_bodies() if coding != 'identity'])
+
+    def get_response(self, request) -> HttpResponse:
+        bodies = self.get_bodies()
+        encoding = self.negotiate(request)
+        response = HttpResponse(bodies[encoding],
+                                content_type='application/json')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .catalog import is_cache_shared
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Предупреждает о кеше в памяти процесса вне режима отладки."""
+    if settings.DEBUG or is_cache_shared():
+        return []
+    return [Warning(
+        'Кеш по умолчанию хранится в памяти процесса.',
+        hint=('Задайте CACHE_LOCATION с адресом memcached: иначе другие '
+              'процессы сервера и команды manage.py не видят изменений '
+              'версий справочников и рецептов и отзыва токенов.'),
+        id='api.W001')]
@@ -0,0 +1,142 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Optional
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from constants import (FEED_BACKFILL_SIZE, FEED_FAN_OUT_BATCH_SIZE,
+                       FEED_FAN_OUT_LIMIT, FEED_HUGE_AUTHORS_TIMEOUT)
+from recipes.models import Recipes
+from subscriptions.models import Subscriptions, TimelineEntry
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+HUGE_AUTHORS_KEY = 'feed_huge_authors'
+
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='feed')
+
+
+def get_huge_author_ids() -> list[int]:
+    """Возвращает id авторов, рецепты которых не раскладываются по лентам.
+
+    Список кешируется на FEED_HUGE_AUTHORS_TIMEOUT секунд.
+    """
+    authors = cache.get(HUGE_AUTHORS_KEY)
+    if authors is None:
+        authors = list(User.objects.filter(
+            followers_count__gt=FEED_FAN_OUT_LIMIT).values_list(
+            'id', flat=True))
+        cache.set(HUGE_AUTHORS_KEY, authors, FEED_HUGE_AUTHORS_TIMEOUT)
+    return authors
+
+
+def fan_out(recipe_id: int, author_id: int) -> int:
+    """Добавляет рецепт в ленты подписчиков автора.
+
+    Возвращает число строк, отправленных на вставку: уже существующие
+    записи пропускает ignore_conflicts, и база не сообщает, сколько их
+    было. Для авторов с числом подписчиков больше FEED_FAN_OUT_LIMIT
+    ничего не делает.
+    """
+    if User.objects.filter(
+            pk=author_id, followers_count__gt=FEED_FAN_OUT_LIMIT).exists():
+        return 0
+    followers = Subscriptions.objects.filter(
+        subscription_id=author_id).values_list('user_id', flat=True)
+    entries = (TimelineEntry(user_id=user_id, recipe_id=recipe_id,
+                             author_id=author_id)
+               for user_id in followers.iterator())
+    attempted = 0
+    while batch := list(islice(entries, FEED_FAN_OUT_BATCH_SIZE)):
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        attempted += len(batch)
+    return attempted
+
+
+def _run_task(task, *args) -> None:
+    try:
+        task(*args)
+    except Exception:
+        logger.exception('Не удалось обновить ленты: %s%s',
+                         task.__name__, args)
+    finally:
+        connection.close()
+
+
+def _schedule(task, *args) -> None:
+    """Ставит задачу в очередь лент после фиксации транзакции.
+
+    Очередь выполняется одним потоком, поэтому задачи одного процесса,
+    например очистка ленты и её заполнение при повторной подписке,
+    выполняются в порядке постановки.
+    """
+    transaction.on_commit(lambda: executor.submit(_run_task, task, *args))
+
+
+def schedule_fan_out(recipe: Recipes) -> None:
+    """Ставит раскладку рецепта по лентам в очередь после фиксации."""
+    _schedule(fan_out, recipe.pk, recipe.author_id)
+
+
+def backfill(user_id: int, author_id: int) -> int:
+    """Добавляет в ленту подписчика последние рецепты нового автора.
+
+    Как и fan_out, возвращает число строк, отправленных на вставку.
+    """
+    if User.objects.filter(
+            pk=author_id, followers_count__gt=FEED_FAN_OUT_LIMIT).exists():
+        return 0
+    recipes = Recipes.objects.filter(author_id=author_id).order_by(
+        '-id').values_list('id', flat=True)[:FEED_BACKFILL_SIZE]
+    entries = TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, recipe_id=recipe_id,
+                       author_id=author_id) for recipe_id in recipes],
+        ignore_conflicts=True)
+    return len(entries)
+
+
+def clear(user_id: int, author_id: int) -> int:
+    """Удаляет из ленты подписчика рецепты автора, от которого он отписался."""
+    deleted, _ = TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id).delete()
+    return deleted
+
+
+def schedule_backfill(user_id: int, author_id: int) -> None:
+    _schedule(backfill, user_id, int(author_id))
+
+
+def schedule_clear(user_id: int, author_id: int) -> None:
+    _schedule(clear, user_id, int(author_id))
+
+
+def get_feed_page(user, before: Optional[int], limit: int) -> list[dict]:
+    """Возвращает страницу ленты — строки с ключами id и author_id.
+
+    Записи ленты пользователя объединяются с рецептами отслеживаемых им
+    авторов с очень большим числом подписчиков. Обе выборки идут по
+    индексам в порядке убывания id рецепта и ограничены размером
+    страницы, поэтому стоимость чтения не зависит от числа подписок.
+    """
+    entries = TimelineEntry.objects.filter(user=user)
+    if before is not None:
+        entries = entries.filter(recipe_id__lt=before)
+    rows = set(entries.order_by('-recipe_id').values_list(
+        'recipe_id', 'author_id')[:limit])
+    huge_authors = get_huge_author_ids()
+    if huge_authors:
+        followed = Subscriptions.objects.filter(
+            user=user, subscription_id__in=huge_authors).values(
+            'subscription_id')
+        recipes = Recipes.objects.filter(author_id__in=followed)
+        if before is not None:
+            recipes = recipes.filter(id__lt=before)
+        rows.update(recipes.order_by('-id').values_list(
+            'id', 'author_id')[:limit])
+    return [{'id': id, 'author_id': author_id}
+            for id, author_id in sorted(rows, reverse=True)[:limit]]
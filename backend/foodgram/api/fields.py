@@ -1,15 +1,72 @@
-import base64
+import binascii
+import re
 
-from django.core.files.base import ContentFile
+from django.core.files.base import File
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image
 from rest_framework import serializers
 
+from constants import MAX_IMAGE_SIDE
+
+BASE64_CHUNK_SIZE = 4 * 64 * 1024
+NOT_BASE64 = re.compile(r'[^A-Za-z0-9+/=]')
+
 
 class Base64ImageField(serializers.ImageField):
-    """Класс поля сериализатора для обработки изображения в формате base64."""
+    """Класс поля сериализатора для обработки изображения в формате base64.
+
+    Строка декодируется частями во временный файл, а размеры изображения
+    проверяются по заголовку до полной проверки файла. Переносы строк и
+    другие символы вне алфавита base64 пропускаются, как в b64decode.
+    """
+
+    default_error_messages = {
+        'invalid_base64': 'Некорректная строка base64.',
+        'too_large': ('Сторона изображения не должна превышать '
+                      f'{MAX_IMAGE_SIDE} пикселей.'),
+    }
 
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return super().to_internal_value(data)
+        if not (isinstance(data, str) and data.startswith('data:image')):
+            return super().to_internal_value(data)
+        format, imgstr = data.split(';base64,')
+        ext = format.split('/')[-1]
+        file = self._decode_to_file(imgstr, 'temp.' + ext, format[5:])
+        self._validate_dimensions(file)
+        super().to_internal_value(file)
+        # Хранилище копирует открытый временный файл, а не перемещает его,
+        # чтобы файл удалился сам при закрытии.
+        return File(file.file, name=file.name)
+
+    def _decode_to_file(self, imgstr, name, content_type):
+        file = TemporaryUploadedFile(name, content_type, 0, None)
+        rest = ''
+        try:
+            for start in range(0, len(imgstr), BASE64_CHUNK_SIZE):
+                chunk = rest + NOT_BASE64.sub(
+                    '', imgstr[start:start + BASE64_CHUNK_SIZE])
+                # Декодируются только целые группы из 4 символов, остаток
+                # переносится в следующую часть.
+                end = len(chunk) - len(chunk) % 4
+                file.write(binascii.a2b_base64(chunk[:end]))
+                rest = chunk[end:]
+            if rest:
+                file.write(binascii.a2b_base64(rest))
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_base64')
+        file.size = file.tell()
+        file.seek(0)
+        return file
+
+    def _validate_dimensions(self, file):
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+        except Exception:
+            return
+        finally:
+            file.seek(0)
+        if max(width, height) > MAX_IMAGE_SIDE:
+            file.close()
+            self.fail('too_large')
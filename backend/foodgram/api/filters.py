@@ -1,10 +1,20 @@
 import django_filters
+from django.db.models import Exists, OuterRef
 
 from recipes.models import Favorites, Recipes, ShoppingCart
+from .search import search_recipes
 
 
 class RecipeFilterSet(django_filters.FilterSet):
-    """Класс для фильтрации рецептов."""
+    """Класс для фильтрации рецептов.
+
+    Теги, избранное и список покупок проверяются коррелированными
+    подзапросами EXISTS, поэтому строки рецептов не дублируются и
+    DISTINCT не нужен. Параметр search ищет рецепты по названию и
+    описанию и сортирует их по релевантности, если не передан параметр
+    ordering=popular, сортирующий рецепты по счётчику добавлений
+    в избранное.
+    """
 
     is_favorited = django_filters.BooleanFilter()
     is_in_shopping_cart = django_filters.BooleanFilter()
@@ -14,6 +24,14 @@ class RecipeFilterSet(django_filters.FilterSet):
         model = Recipes
         fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags')
 
+    @staticmethod
+    def _filter_exists(qs, value, subquery):
+        if value in ('True', '1'):
+            return qs.filter(Exists(subquery))
+        if value in ('False', '0'):
+            return qs.exclude(Exists(subquery))
+        return qs
+
     @property
     def qs(self):  # переопредедление функции django_filters.FilterSet
         user = self.request.user
@@ -21,27 +39,31 @@ class RecipeFilterSet(django_filters.FilterSet):
         if self.data:
             tags = self.data.getlist('tags')
             if tags:
-                qs = qs.filter(tags__slug__in=tags)
+                qs = qs.filter(Exists(Recipes.tags.through.objects.filter(
+                    recipes=OuterRef('pk'), tags__slug__in=tags)))
             author = self.data.getlist('author')
             if author:
                 qs = qs.filter(author__id__in=map(int, author))
 
             is_favorited = self.data.get('is_favorited')
             if is_favorited is not None and user.is_authenticated:
-                recipes_is_favorited_id = Favorites.objects.filter(
-                    user=user, recipe__in=qs).values('recipe_id')
-                if is_favorited in ('True', '1'):
-                    qs = qs.filter(id__in=recipes_is_favorited_id)
-                elif is_favorited in ('False', '0'):
-                    qs = qs.exclude(id__in=recipes_is_favorited_id)
+                qs = self._filter_exists(
+                    qs, is_favorited, Favorites.objects.filter(
+                        user=user, recipe=OuterRef('pk')))
 
             is_in_shopping_cart = self.data.get('is_in_shopping_cart')
             if is_in_shopping_cart is not None and user.is_authenticated:
-                recipes_is_in_shopping_cart_id = ShoppingCart.objects.filter(
-                    user=user, recipe__in=qs).values('recipe_id')
-                if is_in_shopping_cart in ('True', '1'):
-                    qs = qs.filter(id__in=recipes_is_in_shopping_cart_id)
-                elif is_in_shopping_cart in ('False', '0'):
-                    qs = qs.exclude(id__in=recipes_is_in_shopping_cart_id)
+                qs = self._filter_exists(
+                    qs, is_in_shopping_cart, ShoppingCart.objects.filter(
+                        user=user, recipe=OuterRef('pk')))
+
+            search = self.data.get('search')
+            if search:
+                qs = search_recipes(qs, search)
+
+            if self.data.get('ordering') == 'popular':
+                qs = qs.order_by('-favorites_count', '-id')
+            elif search and search.strip():
+                qs = qs.order_by('-search_rank', '-id')
         self._qs = qs
         return self._qs
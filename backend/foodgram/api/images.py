@@ -0,0 +1,60 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image
+
+from constants import (IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_WIDTHS,
+                       IMAGE_VARIANT_WORKERS)
+from recipes.models import Recipes
+from .recipe_cache import bump_recipe_version
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=IMAGE_VARIANT_WORKERS,
+                              thread_name_prefix='image-variants')
+
+
+def schedule_image_variants(recipe: Recipes) -> None:
+    """Ставит создание уменьшенных копий изображения в очередь.
+
+    Задача запускается после фиксации транзакции, чтобы рабочий поток
+    видел сохранённый рецепт.
+    """
+    if not recipe.image:
+        return
+    recipe_id, name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: executor.submit(make_image_variants, recipe_id, name))
+
+
+def make_image_variants(recipe_id: int, name: str) -> None:
+    try:
+        variants = {format: {} for format in IMAGE_VARIANT_FORMATS}
+        root, _ = os.path.splitext(name)
+        directory, filename = os.path.split(root)
+        with default_storage.open(name) as file, Image.open(file) as image:
+            image = image.convert('RGB')
+            for width in IMAGE_VARIANT_WIDTHS:
+                if width >= image.width and variants['jpeg']:
+                    break
+                variant = image.copy()
+                variant.thumbnail((width, image.height))
+                for format, pil_format in IMAGE_VARIANT_FORMATS.items():
+                    buffer = BytesIO()
+                    variant.save(buffer, pil_format, quality=80)
+                    variants[format][str(width)] = default_storage.save(
+                        os.path.join(directory, 'variants',
+                                     f'{filename}_{width}.{format}'),
+                        ContentFile(buffer.getvalue()))
+        if Recipes.objects.filter(pk=recipe_id, image=name).update(
+                image_variants=variants):
+            bump_recipe_version(recipe_id)
+    except Exception:
+        logger.exception('Не удалось создать копии изображения %s', name)
+    finally:
+        connection.close()
@@ -0,0 +1,53 @@
+from typing import Iterable
+
+from recipes.models import Favorites, ShoppingCart
+from subscriptions.models import Subscriptions
+
+RELATIONS = {
+    'subscriptions': (Subscriptions, 'subscription_id'),
+    'favorites': (Favorites, 'recipe_id'),
+    'shopping_cart': (ShoppingCart, 'recipe_id'),
+}
+
+
+class ViewerRelations():
+    """Связи текущего пользователя с авторами и рецептами в ответе.
+
+    Для каждого вида связи хранит множество уже проверенных id и множество
+    связанных с пользователем id. Сериализаторы списков заранее загружают
+    связи для всех объектов страницы одним запросом на вид связи.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._checked = {relation: set() for relation in RELATIONS}
+        self._related = {relation: set() for relation in RELATIONS}
+
+    def prime(self, relation: str, ids: Iterable[int]) -> None:
+        if not self.user.is_authenticated:
+            return
+        ids = set(ids) - self._checked[relation]
+        if not ids:
+            return
+        model, field = RELATIONS[relation]
+        self._related[relation].update(model.objects.filter(
+            user=self.user, **{f'{field}__in': ids}).values_list(
+            field, flat=True))
+        self._checked[relation].update(ids)
+
+    def remember(self, relation: str, id: int) -> None:
+        """Запоминает только что созданную связь без запроса к базе."""
+        self._checked[relation].add(id)
+        self._related[relation].add(id)
+
+    def has(self, relation: str, id: int) -> bool:
+        self.prime(relation, (id,))
+        return id in self._related[relation]
+
+
+def get_viewer_relations(request) -> ViewerRelations:
+    """Возвращает связи пользователя, общие для всего запроса."""
+    relations = getattr(request, '_viewer_relations', None)
+    if relations is None:
+        relations = request._viewer_relations = ViewerRelations(request.user)
+    return relations
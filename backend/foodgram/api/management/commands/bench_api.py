@@ -0,0 +1,364 @@
+import json
+import platform
+import resource
+import subprocess
+from datetime import datetime, timezone
+from statistics import mean, quantiles
+from time import perf_counter
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, reset_queries
+from django.test.utils import (CaptureQueriesContext,
+                               setup_test_environment,
+                               teardown_test_environment)
+from django.urls import URLResolver
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.management.commands.generate_data import (PASSWORD,
+                                                   check_database,
+                                                   synthetic_users,
+                                                   use_database)
+from api.urls import urlpatterns
+from recipes.models import (Favorites, Ingredients, Recipes, ShoppingCart,
+                            Tags)
+from subscriptions.models import Subscriptions
+
+User = get_user_model()
+
+IMAGE = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABie'
+         'ywaAAAACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACk'
+         'lEQVQImWNoAAAAggCByxOyYQAAAABJRU5ErkJggg==')
+SKIPPED = {
+    'users-activation': 'требует письма с активацией',
+    'users-resend-activation': 'отправляет письмо',
+    'users-reset-password': 'отправляет письмо',
+    'users-reset-password-confirm': 'требует токена из письма',
+    'users-reset-username': 'отправляет письмо',
+    'users-reset-username-confirm': 'требует токена из письма',
+    'users-set-username': 'меняет email пользователя',
+    'users-detail PUT': 'меняет учётные данные пользователя',
+    'users-detail PATCH': 'меняет учётные данные пользователя',
+    'users-detail DELETE': 'удаляет пользователя',
+    'users-me PUT': 'меняет учётные данные пользователя',
+    'users-me PATCH': 'меняет учётные данные пользователя',
+    'users-me DELETE': 'удаляет пользователя',
+    'recipes-detail PUT': 'покрыт запросом PATCH',
+    'users/me/avatar/ PATCH': 'покрыт запросом PUT',
+    'api-root': 'служебный маршрут',
+}
+
+
+def get_routes():
+    """Возвращает пары (имя маршрута, метод) всех маршрутов api/urls.py."""
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns)
+            else:
+                yield pattern
+
+    routes = set()
+    for pattern in walk(urlpatterns):
+        callback = pattern.callback
+        name = pattern.name or str(pattern.pattern)
+        actions = getattr(callback, 'actions', None)
+        if actions:
+            methods = actions
+        elif hasattr(callback, 'cls'):
+            methods = [method for method in callback.cls.http_method_names
+                       if hasattr(callback.cls, method)]
+        else:
+            methods = ('get',)
+        routes.update((name, method.upper()) for method in methods
+                      if method not in ('options', 'head'))
+    return routes
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет все маршруты API через тестовый клиент и сохраняет '
+            'p50/p95/p99, число запросов к базе и пиковый RSS в json.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--output', default='bench.json')
+        parser.add_argument('--compare',
+                            help='json предыдущего прогона для сравнения')
+        parser.add_argument('--filter', default='',
+                            help='прогонять только шаги с подстрокой в имени')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='база с данными generate_data; без '
+                                 'DEBUG=True нужна отдельная от default')
+
+    def _client(self, user=None):
+        client = APIClient()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def _fixtures(self):
+        """Выбирает рецепт, автора и пользователей для сценариев.
+
+        Все они созданы generate_data: сценарии меняют аватар, пароль,
+        подписки и избранное, поэтому настоящие аккаунты не трогаются.
+        """
+        users = synthetic_users().filter(is_superuser=False)
+        author = users.order_by('-followers_count', '-id').first()
+        recipe = Recipes.objects.filter(author__in=users).order_by(
+            '-favorites_count', '-id').first()
+        if recipe is None or author is None:
+            raise CommandError('Нет данных: запустите generate_data.')
+        others = list(users.exclude(pk=author.pk).order_by(
+            '-recipes_count', 'id')[:2])
+        if len(others) < 2:
+            raise CommandError('Нужно хотя бы три пользователя '
+                               'generate_data.')
+        viewer, bench_user = others
+        Subscriptions.objects.filter(user=viewer, subscription=author).delete()
+        Favorites.objects.filter(user=viewer, recipe=recipe).delete()
+        ShoppingCart.objects.filter(user=viewer, recipe=recipe).delete()
+        return {
+            'recipe': recipe.pk,
+            'author': author.pk,
+            'viewer': viewer,
+            'bench_user': bench_user,
+            'tag': Tags.objects.values_list('pk', 'slug').first(),
+            'ingredient': Ingredients.objects.values_list(
+                'pk', 'name').first(),
+            'recipe_body': {
+                'name': 'Рецепт для замеров',
+                'text': 'Описание',
+                'cooking_time': 10,
+                'image': IMAGE,
+                'tags': [Tags.objects.values_list('pk', flat=True).first()],
+                'ingredients': [{'id': id, 'amount': 10} for id in
+                                Ingredients.objects.values_list(
+                                    'pk', flat=True)[:5]],
+            },
+        }
+
+    def _scenarios(self, fixtures):
+        """Возвращает сценарии из шагов (имя, метод, путь, тело).
+
+        Шаги сценария выполняются по порядку, и данные возвращаются
+        к исходным.
+        """
+        recipe, author = fixtures['recipe'], fixtures['author']
+        tag_id, tag_slug = fixtures['tag']
+        ingredient_id, ingredient_name = fixtures['ingredient']
+        login = {'email': fixtures['bench_user'].email, 'password': PASSWORD}
+        return {
+            'anonymous': [
+                [('recipes-list', 'GET', '/api/recipes/', None)],
+                [('recipes-list tags', 'GET',
+                  f'/api/recipes/?tags={tag_slug}', None)],
+                [('recipes-list search', 'GET',
+                  '/api/recipes/?search=суп', None)],
+                [('recipes-list cursor', 'GET',
+                  '/api/recipes/?cursor=', None)],
+                [('recipes-detail', 'GET', f'/api/recipes/{recipe}/', None)],
+                [('recipes-similar', 'GET',
+                  f'/api/recipes/{recipe}/similar/', None)],
+                [('recipes-get-link', 'GET',
+                  f'/api/recipes/{recipe}/get-link/', None)],
+                [('tags-list', 'GET', '/api/tags/', None)],
+                [('tags-detail', 'GET', f'/api/tags/{tag_id}/', None)],
+                [('ingredients-list', 'GET',
+                  f'/api/ingredients/?name={ingredient_name[:3]}', None)],
+                [('ingredients-detail', 'GET',
+                  f'/api/ingredients/{ingredient_id}/', None)],
+                [('users-list', 'GET', '/api/users/', None)],
+                [('users-detail', 'GET', f'/api/users/{author}/', None)],
+                [('login', 'POST', '/api/auth/token/login/', login)],
+            ],
+            'viewer': [
+                [('users-me', 'GET', '/api/users/me/', None)],
+                [('subscriptions-list', 'GET',
+                  '/api/users/subscriptions/?recipes_limit=3', None)],
+                [('recipes-list favorited', 'GET',
+                  '/api/recipes/?is_favorited=1', None)],
+                [('recipes-feed', 'GET', '/api/recipes/feed/', None)],
+                [('recipes-feed limit', 'GET',
+                  '/api/recipes/feed/?limit=20', None)],
+                [('recipes-download-shopping-cart', 'GET',
+                  '/api/recipes/download_shopping_cart/', None)],
+                [('users-subscribe', 'POST',
+                  f'/api/users/{author}/subscribe/', None),
+                 ('users-subscribe', 'DELETE',
+                  f'/api/users/{author}/subscribe/', None)],
+                [('recipes-favorite', 'POST',
+                  f'/api/recipes/{recipe}/favorite/', None),
+                 ('recipes-favorite', 'DELETE',
+                  f'/api/recipes/{recipe}/favorite/', None)],
+                [('recipes-shopping-cart', 'POST',
+                  f'/api/recipes/{recipe}/shopping_cart/', None),
+                 ('recipes-shopping-cart', 'DELETE',
+                  f'/api/recipes/{recipe}/shopping_cart/', None)],
+                [('users/me/avatar/', 'PUT', '/api/users/me/avatar/',
+                  {'avatar': IMAGE}),
+                 ('users/me/avatar/', 'DELETE', '/api/users/me/avatar/',
+                  None)],
+                [('users-set-password', 'POST', '/api/users/set_password/',
+                  {'current_password': PASSWORD, 'new_password': PASSWORD})],
+                [('recipes-list', 'POST', '/api/recipes/',
+                  fixtures['recipe_body']),
+                 ('recipes-detail', 'PATCH', '/api/recipes/{created}/',
+                  fixtures['recipe_body']),
+                 ('recipes-detail', 'DELETE', '/api/recipes/{created}/',
+                  None)],
+            ],
+            'bench_user': [
+                [('users-list', 'POST', '/api/users/', {
+                    'email': 'bench{n}@example.com',
+                    'username': 'bench{n}',
+                    'first_name': 'Бенч', 'last_name': 'Марк',
+                    'password': PASSWORD})],
+                [('logout', 'POST', '/api/auth/token/logout/', None)],
+            ],
+        }
+
+    def _request(self, client, method, path, body, state):
+        path = path.format(**state)
+        if body is not None:
+            body = json.loads(json.dumps(body).replace(
+                '{n}', str(state['n'])))
+        reset_queries()
+        with CaptureQueriesContext(connections[state['database']]) as context:
+            start = perf_counter()
+            response = getattr(client, method.lower())(
+                path, body, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = perf_counter() - start
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{method} {path}: {response.status_code} '
+                f'{response.content[:300]!r}')
+        if method == 'POST' and path == '/api/recipes/':
+            state['created'] = response.json()['id']
+        if method == 'POST' and path == '/api/users/':
+            state['users'].append(response.json()['id'])
+        return elapsed, len(context)
+
+    def _record(self, name, method, results, elapsed, queries):
+        result = results.setdefault(f'{name} {method}', {
+            'route': name.split(' ')[0], 'method': method,
+            'latencies': [], 'queries': []})
+        result['latencies'].append(elapsed)
+        result['queries'].append(queries)
+
+    def handle(self, *args, **options):
+        check_database(options['database'])
+        setup_test_environment()
+        try:
+            with use_database(options['database']):
+                self._bench(options)
+        finally:
+            teardown_test_environment()
+
+    def _bench(self, options):
+        fixtures = self._fixtures()
+        clients = {
+            'anonymous': self._client(),
+            'viewer': self._client(fixtures['viewer']),
+            'bench_user': self._client(fixtures['bench_user']),
+        }
+        results = {}
+        state = {'n': 0, 'created': 0, 'users': [],
+                 'database': options['database']}
+        rss = {}
+        for role, scenarios in self._scenarios(fixtures).items():
+            for scenario in scenarios:
+                if not any(options['filter'] in name
+                           for name, *_ in scenario):
+                    continue
+                for iteration in range(
+                        options['warmup'] + options['iterations']):
+                    for name, method, path, body in scenario:
+                        state['n'] += 1
+                        client = clients[role]
+                        if name == 'logout':
+                            client = self._client(fixtures['bench_user'])
+                        elapsed, queries = self._request(
+                            client, method, path, body, state)
+                        if iteration >= options['warmup']:
+                            self._record(name, method, results,
+                                         elapsed, queries)
+                for name, method, *_ in scenario:
+                    rss[f'{name} {method}'] = resource.getrusage(
+                        resource.RUSAGE_SELF).ru_maxrss // 1024
+        User.objects.filter(pk__in=state['users']).delete()
+
+        report = self._report(results, rss, options)
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self._print(report, options['compare'])
+
+    def _report(self, results, rss, options):
+        covered = {(result['route'], result['method'])
+                   for result in results.values()}
+        uncovered = sorted(
+            f'{name} {method}' for name, method in get_routes()
+            if not options['filter'] and (name, method) not in covered
+            and name not in SKIPPED and f'{name} {method}' not in SKIPPED)
+        try:
+            commit = subprocess.run(
+                ('git', 'rev-parse', 'HEAD'), capture_output=True,
+                text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        steps = {}
+        for key, result in results.items():
+            percentiles = quantiles(result['latencies'], n=100,
+                                    method='inclusive')
+            steps[key] = {
+                'route': result['route'],
+                'method': result['method'],
+                'iterations': len(result['latencies']),
+                'mean_ms': round(mean(result['latencies']) * 1000, 3),
+                'p50_ms': round(percentiles[49] * 1000, 3),
+                'p95_ms': round(percentiles[94] * 1000, 3),
+                'p99_ms': round(percentiles[98] * 1000, 3),
+                'queries': max(result['queries']),
+                'peak_rss_mb': rss[key],
+            }
+        return {
+            'meta': {
+                'commit': commit,
+                'created': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connections[options['database']].vendor,
+                'iterations': options['iterations'],
+                'recipes': Recipes.objects.count(),
+                'users': User.objects.count(),
+            },
+            'peak_rss_mb': resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss // 1024,
+            'steps': steps,
+            'uncovered': uncovered,
+            'skipped': SKIPPED,
+        }
+
+    def _print(self, report, compare):
+        previous = {}
+        if compare:
+            with open(compare, encoding='utf-8') as file:
+                previous = json.load(file)['steps']
+        for key, step in report['steps'].items():
+            line = (f'{key:45} p50 {step["p50_ms"]:8.2f} мс  '
+                    f'p99 {step["p99_ms"]:8.2f} мс  '
+                    f'запросов {step["queries"]:3}')
+            if key in previous:
+                ratio = step['p50_ms'] / previous[key]['p50_ms']
+                line += (f'  p50 {ratio:.2f}x  запросов '
+                         f'{previous[key]["queries"]}→{step["queries"]}')
+            self.stdout.write(line)
+        self.stdout.write(f'Пиковый RSS: {report["peak_rss_mb"]} МиБ')
+        if report['uncovered']:
+            self.stdout.write(self.style.WARNING(
+                'Не покрыты: ' + ', '.join(report['uncovered'])))
@@ -0,0 +1,107 @@
+from statistics import quantiles
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+
+from api.feed import fan_out, get_feed_page
+from recipes.models import Recipes
+from subscriptions.models import Subscriptions, TimelineEntry
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Измеряет усиление записи при раскладке рецептов по лентам и '
+            'задержку чтения ленты по сравнению с выборкой рецептов '
+            'подписок при чтении.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5,
+                            help='число читателей с наибольшим числом '
+                                 'подписок')
+        parser.add_argument('--authors', type=int, default=5,
+                            help='число авторов с наибольшим числом '
+                                 'подписчиков')
+        parser.add_argument('--limit', type=int, default=5,
+                            help='размер страницы ленты')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def _percentiles(self, timings):
+        percentiles = quantiles(timings, n=100, method='inclusive')
+        return (f'p50 {percentiles[49] * 1000:7.2f} мс, '
+                f'p99 {percentiles[98] * 1000:7.2f} мс')
+
+    def _write_amplification(self, authors):
+        total = TimelineEntry.objects.count()
+        recipes = Recipes.objects.count()
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Записей лент: {total}, рецептов: {recipes}, в среднем '
+            f'{total / max(recipes, 1):.1f} записи на рецепт'))
+        for author in authors:
+            recipe_id = Recipes.objects.filter(author=author).values_list(
+                'id', flat=True).first()
+            if recipe_id is None:
+                continue
+            with transaction.atomic():
+                TimelineEntry.objects.filter(recipe_id=recipe_id).delete()
+                reset_queries()
+                with CaptureQueriesContext(connection) as context:
+                    start = perf_counter()
+                    rows = fan_out(recipe_id, author.id)
+                    elapsed = perf_counter() - start
+                transaction.set_rollback(True)
+            self.stdout.write(
+                f'автор {author.id} ({author.followers_count} подписчиков): '
+                f'отправлено строк {rows}, запросов {len(context)}, '
+                f'{elapsed * 1000:.1f} мс')
+
+    def _measure(self, read, repeat):
+        read()
+        timings = []
+        for _ in range(repeat):
+            start = perf_counter()
+            read()
+            timings.append(perf_counter() - start)
+        return self._percentiles(timings)
+
+    def _read_latency(self, users, limit, repeat):
+        for user in users:
+            following = Subscriptions.objects.filter(user=user)
+            first_page = get_feed_page(user, None, limit)
+            before = first_page[-1]['id'] if first_page else None
+
+            def join_on_read(before=None):
+                recipes = Recipes.objects.filter(
+                    author_id__in=following.values('subscription_id'))
+                if before is not None:
+                    recipes = recipes.filter(id__lt=before)
+                return list(recipes.order_by('-id').values(
+                    'id', 'author_id')[:limit])
+
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'читатель {user.id} ({following.count()} подписок)'))
+            for name, read in (
+                    ('лента, первая страница',
+                     lambda: get_feed_page(user, None, limit)),
+                    ('лента, вторая страница',
+                     lambda: get_feed_page(user, before, limit)),
+                    ('выборка при чтении, первая страница', join_on_read),
+                    ('выборка при чтении, вторая страница',
+                     lambda: join_on_read(before))):
+                self.stdout.write(
+                    f'  {name:38} {self._measure(read, repeat)}')
+
+    def handle(self, *args, **options):
+        authors = list(User.objects.order_by('-followers_count')[
+            :options['authors']])
+        users = list(User.objects.annotate(
+            following=Count('subscriptions')).order_by('-following')[
+            :options['users']])
+        if not authors:
+            raise CommandError('Нет данных: запустите generate_data.')
+        self._write_amplification(authors)
+        self._read_latency(users, options['limit'], options['repeat'])
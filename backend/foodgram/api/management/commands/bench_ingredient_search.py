@@ -0,0 +1,33 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from api.search import ingredients_index
+from recipes.models import Ingredients
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает поиск ингредиентов через ORM и через индекс в памяти.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('prefixes', nargs='*',
+                            default=['а', 'мо', 'сах', 'соль', 'яйц'])
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def _measure(self, search, prefixes, repeat):
+        start = perf_counter()
+        for _ in range(repeat):
+            for prefix in prefixes:
+                search(prefix)
+        return (perf_counter() - start) / (repeat * len(prefixes)) * 1000
+
+    def handle(self, *args, **options):
+        prefixes, repeat = options['prefixes'], options['repeat']
+        ingredients_index.search('')
+        orm_ms = self._measure(
+            lambda prefix: list(Ingredients.objects.filter(
+                name__startswith=prefix)),
+            prefixes, repeat)
+        index_ms = self._measure(ingredients_index.search, prefixes, repeat)
+        self.stdout.write(f'ORM name__startswith: {orm_ms:.3f} мс/запрос')
+        self.stdout.write(f'Индекс в памяти: {index_ms:.3f} мс/запрос')
@@ -0,0 +1,76 @@
+from time import perf_counter
+from types import SimpleNamespace
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import QueryDict
+
+from api.filters import RecipeFilterSet
+from recipes.models import Recipes, Tags
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Показывает планы EXPLAIN и время выполнения типовых '
+            'фильтров списка рецептов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int,
+                            help='id пользователя для фильтров избранного '
+                                 'и списка покупок')
+        parser.add_argument('--search', default='',
+                            help='строка полнотекстового поиска')
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--analyze', action='store_true',
+                            help='EXPLAIN ANALYZE (только PostgreSQL)')
+
+    def _get_cases(self, user, search):
+        slugs = list(Tags.objects.values_list('slug', flat=True)[:2])
+        author = Recipes.objects.values_list('author', flat=True).first()
+        cases = {
+            'без фильтров': '',
+            'один тег': f'tags={slugs[0]}' if slugs else '',
+            'два тега': '&'.join(f'tags={slug}' for slug in slugs),
+            'автор': f'author={author}',
+            'автор и теги': '&'.join(
+                [f'author={author}'] + [f'tags={slug}' for slug in slugs]),
+        }
+        if search:
+            cases['поиск'] = urlencode({'search': search})
+            cases['поиск и тег'] = urlencode(
+                {'search': search, 'tags': slugs[:1]}, doseq=True)
+        if user.is_authenticated:
+            cases['избранное'] = 'is_favorited=1'
+            cases['список покупок и тег'] = (
+                f'is_in_shopping_cart=1&tags={slugs[0]}' if slugs
+                else 'is_in_shopping_cart=1')
+        return cases
+
+    def handle(self, *args, **options):
+        user = (User.objects.get(pk=options['user']) if options['user']
+                else AnonymousUser())
+        request = SimpleNamespace(user=user)
+        explain = {}
+        if options['analyze'] and connection.vendor == 'postgresql':
+            explain = {'analyze': True, 'buffers': True}
+
+        for name, query in self._get_cases(
+                user, options['search']).items():
+            queryset = RecipeFilterSet(
+                QueryDict(query), queryset=Recipes.objects.all(),
+                request=request).qs
+            page = queryset[:options['limit']]
+            start = perf_counter()
+            for _ in range(options['repeat']):
+                queryset.count()
+                list(page)
+            elapsed = (perf_counter() - start) / options['repeat'] * 1000
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{name} ({query or "-"}): {elapsed:.2f} мс '
+                '(COUNT и первая страница)'))
+            self.stdout.write(page.explain(**explain))
@@ -0,0 +1,139 @@
+from time import perf_counter, process_time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.db.models import Prefetch
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.loaders import get_viewer_relations
+from api.serializers import RecipeReadSerializer, TagSerializer, UserSerializer
+from recipes.models import IngredientInRecipe, Recipes
+
+User = get_user_model()
+
+
+class NestedRecipeSerializer(serializers.ModelSerializer):
+    """Сериализатор рецепта на вложенных полях DRF для сравнения."""
+
+    image = serializers.ImageField()
+    image_variants = serializers.SerializerMethodField()
+    author = UserSerializer()
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
+    tags = TagSerializer(many=True)
+    ingredients = serializers.SerializerMethodField()
+
+    class Meta():
+        model = Recipes
+        fields = ('id', 'image', 'image_variants', 'author', 'is_favorited',
+                  'is_in_shopping_cart', 'name', 'text', 'cooking_time',
+                  'tags', 'ingredients')
+
+    def get_image_variants(self, obj):
+        request = self.context['request']
+        return {
+            format: {width: request.build_absolute_uri(
+                default_storage.url(name)) for width, name in names.items()}
+            for format, names in obj.image_variants.items()}
+
+    def get_is_favorited(self, obj):
+        return get_viewer_relations(self.context['request']).has(
+            'favorites', obj.id)
+
+    def get_is_in_shopping_cart(self, obj):
+        return get_viewer_relations(self.context['request']).has(
+            'shopping_cart', obj.id)
+
+    def get_ingredients(self, obj):
+        return [{'id': ingredient.ingredient.id,
+                 'name': ingredient.ingredient.name,
+                 'measurement_unit': ingredient.ingredient.measurement_unit,
+                 'amount': ingredient.amount}
+                for ingredient in obj.ingredientinrecipe.all()]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает процессорное время сериализации 100 рецептов '
+            'вложенными полями DRF и RecipeReadSerializer с холодным и '
+            'тёплым кешем.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int,
+                            help='id пользователя для полей избранного, '
+                                 'списка покупок и подписки')
+        parser.add_argument('--size', type=int, default=100,
+                            help='число рецептов на странице')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def _request(self, user):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        return request
+
+    def _nested(self, request, size):
+        recipes = list(Recipes.objects.select_related('author')
+                       .prefetch_related('tags', Prefetch(
+                           'ingredientinrecipe',
+                           queryset=IngredientInRecipe.objects.select_related(
+                               'ingredient').order_by('ingredient__name')))
+                       [:size])
+        relations = get_viewer_relations(request)
+        relations.prime('favorites', (recipe.id for recipe in recipes))
+        relations.prime('shopping_cart', (recipe.id for recipe in recipes))
+        relations.prime('subscriptions',
+                        (recipe.author_id for recipe in recipes))
+        return NestedRecipeSerializer(
+            recipes, many=True, context={'request': request}).data
+
+    def _flat(self, request, size):
+        rows = list(Recipes.objects.values('id', 'author_id')[:size])
+        return RecipeReadSerializer(
+            rows, many=True, context={'request': request}).data
+
+    def _measure(self, serialize, user, size, repeat, cold):
+        cpu = wall = queries = 0
+        for _ in range(repeat):
+            if cold:
+                cache.clear()
+            request = self._request(user)
+            reset_queries()
+            with CaptureQueriesContext(connection) as context:
+                cpu_start, wall_start = process_time(), perf_counter()
+                data = JSONRenderer().render(serialize(request, size))
+                cpu += process_time() - cpu_start
+                wall += perf_counter() - wall_start
+            queries = len(context)
+        return data, cpu / repeat, wall / repeat, queries
+
+    def handle(self, *args, **options):
+        user = (User.objects.get(pk=options['user']) if options['user']
+                else AnonymousUser())
+        size, repeat = options['size'], options['repeat']
+        if not Recipes.objects.exists():
+            raise CommandError('Нет рецептов: запустите generate_data.')
+
+        results = {}
+        for name, serialize, cold in (
+                ('вложенные поля DRF', self._nested, True),
+                ('RecipeReadSerializer, холодный кеш', self._flat, True),
+                ('RecipeReadSerializer, тёплый кеш', self._flat, False)):
+            self._measure(serialize, user, size, 1, cold)
+            data, cpu, wall, queries = self._measure(
+                serialize, user, size, repeat, cold)
+            results[name] = data
+            scale = 100 / size * 1000
+            self.stdout.write(
+                f'{name:36} CPU {cpu * scale:7.2f} мс, '
+                f'всего {wall * scale:7.2f} мс на 100 рецептов, '
+                f'запросов {queries}')
+        if len(set(results.values())) != 1:
+            raise CommandError('Ответы сериализаторов различаются.')
+        self.stdout.write(self.style.SUCCESS('Ответы совпадают побайтно.'))
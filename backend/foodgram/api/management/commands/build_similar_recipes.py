@@ -0,0 +1,70 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api import similar
+from constants import SIMILAR_RECIPES_BATCH_SIZE
+from recipes.models import Recipes, SimilarRecipe
+
+
+class Command(BaseCommand):
+    help = ('Рассчитывает для каждого рецепта похожие рецепты по '
+            'ингредиентам и тегам и сохраняет их в таблицу похожих. '
+            'С --recipe пересчитывает только один рецепт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='число процессов')
+        parser.add_argument('--batch-size', type=int,
+                            default=SIMILAR_RECIPES_BATCH_SIZE,
+                            help='число рецептов в задаче процесса')
+        parser.add_argument('--recipe', type=int,
+                            help='id изменившегося рецепта')
+
+    def _batches(self, size, batch_size):
+        return (range(start, min(start + batch_size, size))
+                for start in range(0, size, batch_size))
+
+    def _compute(self, index, workers, batch_size):
+        batches = self._batches(len(index.recipe_ids), batch_size)
+        if workers <= 1:
+            similar.init_worker(index)
+            yield from map(similar.top_in_worker, batches)
+            return
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=similar.init_worker,
+                                 initargs=(index,)) as executor:
+            yield from executor.map(similar.top_in_worker, batches)
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        if options['recipe'] is not None:
+            if not Recipes.objects.filter(pk=options['recipe']).exists():
+                raise CommandError('Рецепт не найден.')
+            similar.update_similar_recipes(options['recipe'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Пересчитано за {perf_counter() - start:.2f} с.'))
+            return
+
+        index = similar.load_index()
+        self.stdout.write(
+            f'Рецептов: {len(index.recipe_ids)}, загружено за '
+            f'{perf_counter() - start:.1f} с, расчёт на '
+            f'{"NumPy" if similar.np is not None else "Python"}.')
+        created = 0
+        with transaction.atomic():
+            SimilarRecipe.objects.all().delete()
+            for batch in self._compute(index, options['workers'],
+                                       options['batch_size']):
+                rows = [SimilarRecipe(recipe_id=recipe_id,
+                                      similar_id=similar_id, score=score)
+                        for recipe_id, neighbours in batch
+                        for similar_id, score in neighbours]
+                SimilarRecipe.objects.bulk_create(rows)
+                created += len(rows)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей похожих рецептов: {created} за '
+            f'{perf_counter() - start:.1f} с.'))
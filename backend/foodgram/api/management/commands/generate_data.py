@@ -0,0 +1,227 @@
+import random
+from io import BytesIO
+from itertools import islice
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.test.utils import override_settings
+from PIL import Image
+
+from recipes.models import (Favorites, IngredientInRecipe, Ingredients,
+                            Recipes, ShoppingCart, Tags)
+from subscriptions.models import Subscriptions
+
+User = get_user_model()
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+PASSWORD = 'benchPassw0rd!'
+USERNAME_PREFIX = 'synthetic'
+EMAIL_DOMAIN = '@example.com'
+IMAGE_NAME = 'recipes/image/synthetic.jpg'
+TAGS = (('Завтрак', 'breakfast'), ('Обед', 'lunch'), ('Ужин', 'dinner'),
+        ('Десерт', 'dessert'), ('Выпечка', 'bakery'), ('Суп', 'soup'))
+WORDS = ('быстрый', 'домашний', 'пряный', 'летний', 'сытный', 'лёгкий',
+         'бабушкин', 'праздничный', 'острый', 'нежный', 'хрустящий')
+DISHES = ('суп', 'салат', 'пирог', 'омлет', 'рагу', 'паста', 'запеканка',
+          'плов', 'борщ', 'каша', 'котлеты', 'блины', 'соус', 'торт')
+
+
+def check_database(database):
+    """Запрещает синтетические данные и замеры на рабочей базе.
+
+    Команды создают пользователей с известным паролем и меняют данные,
+    поэтому работают только в режиме отладки или с отдельной базой.
+    """
+    if database not in settings.DATABASES:
+        raise CommandError(f'Нет базы данных {database!r} в DATABASES.')
+    if not settings.DEBUG and database == DEFAULT_DB_ALIAS:
+        raise CommandError(
+            'Команда работает только при DEBUG=True или с отдельной базой '
+            'в --database.')
+
+
+class DatabaseRouter:
+    """Направляет все запросы моделей в базу из --database."""
+
+    def __init__(self, database):
+        self.database = database
+
+    def db_for_read(self, model, **hints):
+        return self.database
+
+    def db_for_write(self, model, **hints):
+        return self.database
+
+
+def use_database(database):
+    """Контекст, в котором ORM работает с базой из --database."""
+    return override_settings(DATABASE_ROUTERS=[DatabaseRouter(database)])
+
+
+def synthetic_users():
+    """Пользователи, созданные generate_data."""
+    return User.objects.filter(username__startswith=USERNAME_PREFIX,
+                               email__endswith=EMAIL_DOMAIN)
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, рецептами, '
+            'избранным, списками покупок и подписками для замеров '
+            'производительности.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='10k',
+                            help='число рецептов')
+        parser.add_argument('--recipes', type=int,
+                            help='точное число рецептов вместо --scale')
+        parser.add_argument('--users', type=int,
+                            help='число пользователей, по умолчанию '
+                                 'десятая часть числа рецептов')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='среднее число избранных рецептов '
+                                 'и рецептов в списке покупок на '
+                                 'пользователя')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='среднее число подписок на пользователя')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='база для данных; без DEBUG=True '
+                                 'нужна отдельная от default')
+
+    def _bulk(self, model, objects, batch_size, **kwargs):
+        objects = iter(objects)
+        while batch := list(islice(objects, batch_size)):
+            model.objects.bulk_create(batch, batch_size=batch_size,
+                                      **kwargs)
+
+    def _created_ids(self, model, objects, first_id):
+        """Возвращает id созданных объектов.
+
+        SQLite в Django 3.2 не возвращает id из bulk_create, поэтому они
+        дочитываются по порядку вставки.
+        """
+        if objects[0].pk is not None:
+            return [obj.pk for obj in objects]
+        return list(model.objects.filter(pk__gt=first_id).order_by(
+            'pk').values_list('pk', flat=True))
+
+    def _last_id(self, model):
+        return model.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+
+    def _weighted(self, ids, count):
+        """Выбирает id с перекосом в пользу первых — популярных."""
+        size = len(ids)
+        return {ids[min(int(random.paretovariate(1.2)) - 1, size - 1)
+                    if random.random() < 0.5
+                    else random.randrange(size)]
+                for _ in range(count)}
+
+    def _image(self):
+        if not default_storage.exists(IMAGE_NAME):
+            buffer = BytesIO()
+            Image.new('RGB', (640, 480), (200, 120, 60)).save(
+                buffer, 'JPEG')
+            default_storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+        return IMAGE_NAME
+
+    def _users(self, count, batch_size):
+        password = make_password(PASSWORD)
+        first_id = self._last_id(User)
+        suffix = first_id + 1
+        users = [User(username=f'{USERNAME_PREFIX}{suffix + i}',
+                      email=f'{USERNAME_PREFIX}{suffix + i}{EMAIL_DOMAIN}',
+                      first_name='Имя', last_name='Фамилия',
+                      password=password)
+                 for i in range(count)]
+        self._bulk(User, users, batch_size)
+        return self._created_ids(User, users, first_id)
+
+    def _recipes(self, count, authors, batch_size):
+        tags = [Tags.objects.get_or_create(name=name, slug=slug)[0].pk
+                for name, slug in TAGS]
+        ingredients = list(Ingredients.objects.values_list('pk', flat=True))
+        image = self._image()
+        recipe_ids = []
+        for start in range(0, count, batch_size):
+            first_id = self._last_id(Recipes)
+            recipes = [Recipes(
+                author_id=author,
+                name=f'{random.choice(WORDS).capitalize()} '
+                     f'{random.choice(DISHES)} №{start + i + 1}',
+                text=' '.join(random.choices(WORDS + DISHES, k=40)),
+                cooking_time=random.randint(5, 180),
+                image=image)
+                for i, author in enumerate(
+                    random.choices(authors, k=min(batch_size,
+                                                  count - start)))]
+            Recipes.objects.bulk_create(recipes, batch_size=batch_size)
+            ids = self._created_ids(Recipes, recipes, first_id)
+            Recipes.tags.through.objects.bulk_create(
+                [Recipes.tags.through(recipes_id=id, tags_id=tag)
+                 for id in ids
+                 for tag in random.sample(tags, random.randint(1, 3))],
+                batch_size=batch_size)
+            IngredientInRecipe.objects.bulk_create(
+                [IngredientInRecipe(recipe_id=id, ingredient_id=ingredient,
+                                    amount=random.randint(1, 500))
+                 for id in ids
+                 for ingredient in random.sample(
+                     ingredients, random.randint(3, 10))],
+                batch_size=batch_size)
+            recipe_ids += ids
+            self.stdout.write(f'Рецептов: {len(recipe_ids)}', ending='\r')
+        self.stdout.write('')
+        return recipe_ids
+
+    def _relations(self, model, field, users, targets, average, batch_size,
+                   exclude_self=False):
+        def objects():
+            for user in users:
+                for target in self._weighted(
+                        targets, random.randint(0, 2 * average)):
+                    if not (exclude_self and target == user):
+                        yield model(user_id=user, **{field: target})
+        self._bulk(model, objects(), batch_size, ignore_conflicts=True)
+
+    def handle(self, *args, **options):
+        check_database(options['database'])
+        with use_database(options['database']):
+            self._generate(options)
+
+    def _generate(self, options):
+        random.seed(options['seed'])
+        batch_size = options['batch_size']
+        recipes_count = options['recipes'] or SCALES[options['scale']]
+        users_count = options['users'] or max(recipes_count // 10, 1)
+        if not Ingredients.objects.exists():
+            call_command('load_ingredients', stdout=self.stdout)
+        if not Ingredients.objects.exists():
+            raise CommandError('Справочник ингредиентов пуст.')
+
+        start = perf_counter()
+        with transaction.atomic(using=options['database']):
+            users = self._users(users_count, batch_size)
+            recipes = self._recipes(recipes_count, users, batch_size)
+            self._relations(Favorites, 'recipe_id', users, recipes,
+                            options['favorites'], batch_size)
+            self._relations(ShoppingCart, 'recipe_id', users, recipes,
+                            options['favorites'] // 4, batch_size)
+            self._relations(Subscriptions, 'subscription_id', users, users,
+                            options['subscriptions'], batch_size,
+                            exclude_self=True)
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('rebuild_feed', stdout=self.stdout)
+        call_command('build_similar_recipes', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(users)}, рецептов: '
+            f'{len(recipes)} за {perf_counter() - start:.1f} с. '
+            f'Пароль пользователей: {PASSWORD}'))
@@ -0,0 +1,98 @@
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+from time import perf_counter
+from typing import Iterator
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.catalog import bump_catalog_version, is_cache_shared
+from recipes.models import Ingredients
+
+DEFAULT_PATH = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(path: Path) -> Iterator[tuple[str, str]]:
+    """Построчно читает пары название-единица измерения из csv."""
+    with open(path, encoding='utf-8') as csv_file:
+        for row in csv.reader(csv_file):
+            if len(row) >= 2:
+                yield row[0], row[1]
+
+
+def read_json(path: Path) -> Iterator[tuple[str, str]]:
+    """Читает массив объектов json по частям, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as json_file:
+        buffer = json_file.read(JSON_CHUNK_SIZE).lstrip()
+        if not buffer.startswith('['):
+            raise CommandError('Ожидался массив объектов json.')
+        buffer = buffer[1:]
+        while True:
+            buffer = buffer.lstrip().lstrip(',').lstrip()
+            if buffer.startswith(']'):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                chunk = json_file.read(JSON_CHUNK_SIZE)
+                if not chunk:
+                    raise CommandError('Некорректный файл json.')
+                buffer += chunk
+                continue
+            buffer = buffer[end:]
+            yield item['name'], item['measurement_unit']
+
+
+class Command(BaseCommand):
+    help = ('Загружает ингредиенты из csv или json: добавляет новые и '
+            'обновляет единицы измерения существующих, сохраняя их id.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', type=Path,
+                            default=DEFAULT_PATH)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def _upsert(self, batch):
+        units = {name.strip(): unit.strip() for name, unit in batch
+                 if name.strip()}
+        existing = {
+            name: (id, unit) for id, name, unit in
+            Ingredients.objects.filter(name__in=units).values_list(
+                'id', 'name', 'measurement_unit')}
+        created = [Ingredients(name=name, measurement_unit=unit)
+                   for name, unit in units.items() if name not in existing]
+        updated = [Ingredients(id=id, measurement_unit=units[name])
+                   for name, (id, unit) in existing.items()
+                   if unit != units[name]]
+        Ingredients.objects.bulk_create(created, ignore_conflicts=True)
+        Ingredients.objects.bulk_update(updated, ('measurement_unit',))
+        return len(units), len(created), len(updated)
+
+    def handle(self, *args, **options):
+        path, batch_size = options['path'], options['batch_size']
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден.')
+        rows = read_json(path) if path.suffix == '.json' else read_csv(path)
+
+        start = perf_counter()
+        total = created = updated = 0
+        with transaction.atomic():
+            while batch := list(islice(rows, batch_size)):
+                counts = self._upsert(batch)
+                total += counts[0]
+                created += counts[1]
+                updated += counts[2]
+        bump_catalog_version('ingredients')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано: {total}, добавлено: {created}, '
+            f'обновлено: {updated} за {perf_counter() - start:.2f} с.'))
+        if not is_cache_shared():
+            self.stdout.write(self.style.WARNING(
+                'Кеш не общий (не задан CACHE_LOCATION): запущенный сервер '
+                'не увидит новую версию справочника. Перезапустите его, '
+                'чтобы обновить поиск и снимок ингредиентов.'))
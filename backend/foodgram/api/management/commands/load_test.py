@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from statistics import quantiles
+from time import perf_counter
+
+import requests
+from django.core.management.base import BaseCommand
+
+from api.short_links import get_short_link_code
+from recipes.models import Ingredients, Recipes
+
+
+class Command(BaseCommand):
+    help = ('Нагружает запущенный сервер запросами к читающим эндпоинтам и '
+            'выводит число запросов в секунду и задержки p50 и p99.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--duration', type=float, default=20,
+                            help='длительность нагрузки на путь, секунды')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='путь для нагрузки; по умолчанию набор '
+                                 'читающих эндпоинтов')
+
+    def _get_paths(self):
+        recipe = Recipes.objects.order_by('-id').values_list(
+            'id', flat=True).first()
+        ingredient = Ingredients.objects.values_list('name', flat=True).first()
+        paths = ['/api/recipes/', '/api/tags/']
+        if ingredient:
+            paths.append(f'/api/ingredients/?name={ingredient[:2]}')
+        if recipe:
+            paths += [f'/api/recipes/{recipe}/',
+                      f'/s/{get_short_link_code(recipe)}/']
+        return paths
+
+    def _load(self, url, concurrency, duration):
+        local = threading.local()
+        latencies, errors = [], 0
+        lock = threading.Lock()
+        deadline = perf_counter() + duration
+
+        def worker():
+            nonlocal errors
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = requests.Session()
+            while perf_counter() < deadline:
+                start = perf_counter()
+                try:
+                    ok = session.get(
+                        url, allow_redirects=False, timeout=30).ok
+                except requests.RequestException:
+                    ok = False
+                elapsed = perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    errors += not ok
+
+        started = perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for _ in range(concurrency):
+                executor.submit(worker)
+        total = perf_counter() - started
+        return latencies, errors, total
+
+    def handle(self, *args, **options):
+        for path in options['paths'] or self._get_paths():
+            latencies, errors, total = self._load(
+                options['url'] + path, options['concurrency'],
+                options['duration'])
+            if len(latencies) < 2:
+                self.stdout.write(f'{path}: недостаточно ответов')
+                continue
+            percentiles = quantiles(latencies, n=100)
+            self.stdout.write(
+                f'{path}: {len(latencies) / total:.1f} запр./с, '
+                f'p50 {percentiles[49] * 1000:.1f} мс, '
+                f'p99 {percentiles[98] * 1000:.1f} мс, '
+                f'ошибок {errors} из {len(latencies)}')
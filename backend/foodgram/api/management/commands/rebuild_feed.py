@@ -0,0 +1,47 @@
+from itertools import islice
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from constants import (FEED_BACKFILL_SIZE, FEED_FAN_OUT_BATCH_SIZE,
+                       FEED_FAN_OUT_LIMIT)
+from recipes.models import Recipes
+from subscriptions.models import Subscriptions, TimelineEntry
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Перестраивает ленты подписчиков: каждому подписчику '
+            'добавляются последние рецепты авторов, на которых он '
+            'подписан. Счётчики подписчиков должны быть сверены '
+            'командой reconcile_counters.')
+
+    def _entries(self, author_id):
+        recipes = list(Recipes.objects.filter(author_id=author_id).order_by(
+            '-id').values_list('id', flat=True)[:FEED_BACKFILL_SIZE])
+        followers = Subscriptions.objects.filter(
+            subscription_id=author_id).values_list('user_id', flat=True)
+        for user_id in followers.iterator():
+            for recipe_id in recipes:
+                yield TimelineEntry(user_id=user_id, recipe_id=recipe_id,
+                                    author_id=author_id)
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        authors = list(User.objects.filter(
+            followers_count__range=(1, FEED_FAN_OUT_LIMIT),
+            recipes_count__gt=0).values_list('id', flat=True))
+        created = 0
+        with transaction.atomic():
+            TimelineEntry.objects.all().delete()
+            for author_id in authors:
+                entries = self._entries(author_id)
+                while batch := list(islice(entries,
+                                           FEED_FAN_OUT_BATCH_SIZE)):
+                    TimelineEntry.objects.bulk_create(batch)
+                    created += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей лент: {created} за {perf_counter() - start:.1f} с.'))
@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorites, Recipes, ShoppingCart
+from subscriptions.models import Subscriptions
+
+User = get_user_model()
+
+
+def count_subquery(model, field):
+    """Подзапрос, считающий строки model, ссылающиеся на текущий объект."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()), 0)
+
+
+COUNTERS = (
+    (Recipes, 'favorites_count', count_subquery(Favorites, 'recipe')),
+    (Recipes, 'shopping_cart_count', count_subquery(ShoppingCart, 'recipe')),
+    (User, 'recipes_count', count_subquery(Recipes, 'author')),
+    (User, 'followers_count', count_subquery(Subscriptions, 'subscription')),
+)
+
+
+class Command(BaseCommand):
+    help = ('Сверяет денормализованные счётчики с реальным числом строк '
+            'и исправляет разошедшиеся значения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать число расхождений.')
+
+    def handle(self, *args, **options):
+        for model, field, actual in COUNTERS:
+            drifted = list(model.objects.annotate(actual=actual).filter(
+                ~Q(**{field: F('actual')})).values_list('pk', flat=True))
+            if drifted and not options['dry_run']:
+                model.objects.filter(pk__in=drifted).update(**{field: actual})
+            self.stdout.write(
+                f'{model._meta.label}.{field}: '
+                f'расхождений {len(drifted)}')
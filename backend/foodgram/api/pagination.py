@@ -1,8 +1,108 @@
-from rest_framework.pagination import PageNumberPagination
+from typing import Optional
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def parse_positive_int(value: str, cutoff: Optional[int] = None) -> int:
+    """Разбирает положительное целое из параметра запроса.
+
+    Ноль, отрицательные и нечисловые значения вызывают ValueError,
+    значения больше cutoff заменяются на cutoff.
+    """
+    if not value.isdigit() or int(value) == 0:
+        raise ValueError(value)
+    if cutoff is not None:
+        return min(int(value), cutoff)
+    return int(value)
+
+
+class UsersRecipeCursorPagination(CursorPagination):
+    """Класс для курсорной пагинации без подсчёта общего числа объектов."""
+
+    page_size = 5
+    page_size_query_param = 'limit'
+    ordering = '-id'
 
 
 class UsersRecipePagination(PageNumberPagination):
-    """Класс для пагинации пользователей, подписок и рецептов."""
+    """Класс для пагинации пользователей, подписок и рецептов.
+
+    По умолчанию пагинация постраничная. Если в запросе передан параметр
+    cursor (для первой страницы — пустой), используется курсорная пагинация.
+    Она всегда идёт по убыванию id, поэтому вместе с сортировкой по
+    релевантности (search) или популярности (ordering) не допускается.
+    """
 
     page_size = 5
     page_size_query_param = 'limit'
+    cursor_pagination = None
+    cursor_conflicts = ('search', 'ordering')
+    cursor_conflict_message = 'Параметр cursor нельзя сочетать с {}.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if UsersRecipeCursorPagination.cursor_query_param in (
+                request.query_params):
+            conflicts = [param for param in self.cursor_conflicts
+                         if request.query_params.get(param, '').strip()]
+            if conflicts:
+                raise ValidationError({
+                    UsersRecipeCursorPagination.cursor_query_param: [
+                        self.cursor_conflict_message.format(
+                            ', '.join(conflicts))]})
+            self.cursor_pagination = UsersRecipeCursorPagination()
+            return self.cursor_pagination.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination is not None:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedPagination(BasePagination):
+    """Класс для keyset-пагинации ленты по убыванию id рецепта.
+
+    Вместо набора запросов получает функцию get_page(before, limit),
+    возвращающую строки с ключом id. Следующая страница запрашивается
+    параметром before с id последнего рецепта текущей.
+    """
+
+    page_size = 5
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    before_query_param = 'before'
+    invalid_before_message = 'Некорректное значение before.'
+
+    def paginate_queryset(self, get_page, request, view=None):
+        self.request = request
+        try:
+            page_size = parse_positive_int(
+                request.query_params[self.page_size_query_param],
+                cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            page_size = self.page_size
+        before = request.query_params.get(self.before_query_param)
+        if before is not None:
+            try:
+                before = parse_positive_int(before)
+            except ValueError:
+                raise ValidationError(
+                    {self.before_query_param: self.invalid_before_message})
+        rows = get_page(before, page_size + 1)
+        self.next_before = (rows[page_size - 1]['id']
+                            if len(rows) > page_size else None)
+        return rows[:page_size]
+
+    def get_next_link(self):
+        if self.next_before is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.before_query_param, self.next_before)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
@@ -0,0 +1,64 @@
+from typing import Callable, Sequence
+
+from django.core.cache import cache
+from django.db import transaction
+
+from constants import RECIPE_CACHE_LOCAL_TIMEOUT, RECIPE_CACHE_TIMEOUT
+from .catalog import (CATALOG_VERSION_KEY, bump_version, get_versions,
+                      is_cache_shared)
+
+RECIPE_VERSION_KEY = 'recipe_version:{}'
+USER_VERSION_KEY = 'user_version:{}'
+RECIPE_CACHE_KEY = 'recipe:{}:{}'
+
+
+def bump_recipe_version(recipe_id: int) -> None:
+    """Сбрасывает кеш представления рецепта после фиксации транзакции."""
+    transaction.on_commit(
+        lambda: bump_version(RECIPE_VERSION_KEY.format(recipe_id)))
+
+
+def bump_user_version(user_id: int) -> None:
+    """Сбрасывает кеш представлений всех рецептов автора."""
+    transaction.on_commit(
+        lambda: bump_version(USER_VERSION_KEY.format(user_id)))
+
+
+def get_cached_representations(
+        recipes: Sequence[dict], host: str,
+        build: Callable[[list[dict]], list[dict]]) -> list[dict]:
+    """Возвращает не зависящие от пользователя представления рецептов.
+
+    Рецепты передаются словарями с ключами id и author_id. Ключ записи
+    содержит версии рецепта, автора и справочников тегов и ингредиентов,
+    поэтому изменение любого из них делает запись недоступной. Версии и
+    записи страницы читаются двумя обращениями к кешу, отсутствующие
+    записи строятся одним вызовом build для всех таких рецептов.
+
+    Версии сбрасываются во всех процессах, только если кеш общий. С кешем
+    в памяти процесса записи живут RECIPE_CACHE_LOCAL_TIMEOUT секунд:
+    другие процессы не узнают об изменении рецепта и отдают старое
+    представление не дольше этого времени.
+    """
+    catalog_keys = [CATALOG_VERSION_KEY.format(catalog)
+                    for catalog in ('tags', 'ingredients')]
+    versions = get_versions(
+        [RECIPE_VERSION_KEY.format(recipe['id']) for recipe in recipes]
+        + [USER_VERSION_KEY.format(recipe['author_id'])
+           for recipe in recipes]
+        + catalog_keys)
+    catalog_version = '.'.join(str(versions[key]) for key in catalog_keys)
+    keys = [RECIPE_CACHE_KEY.format(recipe['id'], '.'.join((
+        str(versions[RECIPE_VERSION_KEY.format(recipe['id'])]),
+        str(versions[USER_VERSION_KEY.format(recipe['author_id'])]),
+        catalog_version, host))) for recipe in recipes]
+
+    entries = cache.get_many(keys)
+    missing = {key: recipe for key, recipe in zip(keys, recipes)
+               if key not in entries}
+    if missing:
+        built = dict(zip(missing, build(list(missing.values()))))
+        cache.set_many(built, RECIPE_CACHE_TIMEOUT if is_cache_shared()
+                       else RECIPE_CACHE_LOCAL_TIMEOUT)
+        entries.update(built)
+    return [entries[key] for key in keys]
@@ -0,0 +1,138 @@
+import sys
+import threading
+from bisect import bisect_left
+from typing import Optional
+
+from django.db import connections
+from django.db.models import (Case, Expression, FloatField, Func, Q,
+                              QuerySet, TextField, Value, When)
+
+from constants import RECIPE_SEARCH_CONFIG
+from recipes.models import Ingredients
+from .catalog import get_catalog_version
+
+
+def normalize(value: str) -> str:
+    """Приводит строку к виду для поиска без учёта регистра и буквы «ё»."""
+    return ' '.join(value.casefold().replace('ё', 'е').split())
+
+
+class IngredientsIndex():
+    """Индекс ингредиентов в памяти процесса для поиска по названию.
+
+    Названия хранятся в отсортированном списке, префиксы ищутся бинарным
+    поиском. Индекс перестраивается при смене версии справочника
+    ингредиентов. Версия хранится в общем кеше, поэтому загрузка
+    ингредиентов командой manage.py доходит до всех процессов сервера.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = ([], [])
+
+    def _build(self, version):
+        ingredients = sorted(
+            ((normalize(name), Ingredients(id=id, name=name,
+                                           measurement_unit=unit))
+             for id, name, unit in Ingredients.objects.values_list(
+                'id', 'name', 'measurement_unit')),
+            key=lambda item: item[0])
+        self._entries = ([name for name, _ in ingredients],
+                         [ingredient for _, ingredient in ingredients])
+        self._version = version
+
+    def _actualize(self):
+        version = get_catalog_version('ingredients')
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build(version)
+
+    def search(self, query: str,
+               limit: Optional[int] = None) -> list[Ingredients]:
+        """Ищет ингредиенты: точное совпадение, префикс, подстрока."""
+        self._actualize()
+        names, ingredients = self._entries
+        query = normalize(query)
+        start = bisect_left(names, query)
+        end = bisect_left(names, query + chr(sys.maxunicode), start)
+        result = ingredients[start:end]
+        if limit is not None and len(result) >= limit:
+            return result[:limit]
+        for position, name in enumerate(names):
+            if start <= position < end or query not in name:
+                continue
+            result.append(ingredients[position])
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+
+ingredients_index = IngredientsIndex()
+
+
+class Normalize(Func):
+    """Функция normalize в SQLite, см. register_sqlite_functions."""
+
+    function = 'foodgram_normalize'
+    output_field = TextField()
+
+
+def register_sqlite_functions(connection) -> None:
+    """Регистрирует normalize в подключении SQLite.
+
+    LIKE и LOWER в SQLite не меняют регистр кириллицы, поэтому поиск
+    рецептов без PostgreSQL сравнивает строки, приведённые normalize.
+    """
+    connection.connection.create_function(
+        Normalize.function, 1,
+        lambda value: None if value is None else normalize(value),
+        deterministic=True)
+
+
+class SearchVectorColumn(Expression):
+    """Генерируемый столбец search_vector таблицы рецептов.
+
+    Столбец создаётся миграцией только в PostgreSQL и не объявлен полем
+    модели, чтобы Django не пытался записывать в него значения.
+    """
+
+    def as_sql(self, compiler, connection):
+        table = compiler.quote_name_unless_alias(compiler.query.base_table)
+        return f'{table}.{connection.ops.quote_name("search_vector")}', []
+
+
+def search_recipes(queryset: QuerySet, query: str) -> QuerySet:
+    """Отбирает рецепты по названию и описанию и добавляет search_rank.
+
+    В PostgreSQL запрос сопоставляется со столбцом search_vector по
+    GIN-индексу с русской морфологией, а search_rank вычисляет ts_rank.
+    В остальных СУБД каждое слово ищется подстрокой, и выше ставятся
+    рецепты, в названии которых встречается весь запрос. В SQLite
+    строки и запрос сравниваются после normalize.
+    """
+    query = ' '.join(query.split())
+    if not query:
+        return queryset
+    if connections[queryset.db].vendor == 'postgresql':
+        from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                    SearchVectorField)
+        search_query = SearchQuery(
+            query, config=RECIPE_SEARCH_CONFIG, search_type='websearch')
+        vector = SearchVectorColumn(output_field=SearchVectorField())
+        return queryset.alias(search_vector=vector).filter(
+            search_vector=search_query).alias(
+            search_rank=SearchRank(vector, search_query))
+    name, text, lookup = 'name', 'text', 'icontains'
+    if connections[queryset.db].vendor == 'sqlite':
+        queryset = queryset.alias(search_name=Normalize('name'),
+                                  search_text=Normalize('text'))
+        name, text, lookup = 'search_name', 'search_text', 'contains'
+        query = normalize(query)
+    for word in query.split():
+        queryset = queryset.filter(Q(**{f'{name}__{lookup}': word})
+                                   | Q(**{f'{text}__{lookup}': word}))
+    return queryset.alias(search_rank=Case(
+        When(**{f'{name}__{lookup}': query}, then=Value(1.0)),
+        default=Value(0.0), output_field=FloatField()))
@@ -1,21 +1,33 @@
+from collections import defaultdict
+
 from django.contrib.auth import get_user_model
-from django.db.models import F
+from django.core.files.storage import default_storage
+from django.db import models, transaction
 from djoser.serializers import (
     UserSerializer as DjoserUserSerializer,
     UserCreateSerializer as DjoserUserCreateSerializer)
 from rest_framework import serializers
 from rest_framework.exceptions import PermissionDenied
 
-from recipes.models import (Favorites, IngredientInRecipe, Ingredients,
-                            Recipes, ShoppingCart, Tags)
+from recipes.models import IngredientInRecipe, Ingredients, Recipes, Tags
 from subscriptions.models import Subscriptions
 from .fields import Base64ImageField
-from .utils import create_M2M_recipe_field
+from .images import schedule_image_variants
+from .loaders import get_viewer_relations
+from .recipe_cache import get_cached_representations
+from .similar import schedule_similar_update
+from .telemetry import TimedDataMixin, TimedListSerializer
+from .utils import create_M2M_recipe_field, update_M2M_recipe_field
 
 User = get_user_model()
 
+RECIPE_READ_COLUMNS = ('id', 'image', 'image_variants', 'name', 'text',
+                       'cooking_time', 'author_id', 'author__email',
+                       'author__username', 'author__first_name',
+                       'author__last_name', 'author__avatar')
+
 
-class UserAvatarSerializer(serializers.ModelSerializer):
+class UserAvatarSerializer(TimedDataMixin, serializers.ModelSerializer):
     """Сериализатор для работы с полем avatar модели User."""
 
     avatar = Base64ImageField(required=True, allow_null=True)
@@ -25,6 +37,18 @@ class UserAvatarSerializer(serializers.ModelSerializer):
         fields = ('avatar',)
 
 
+class ViewerRelationsListSerializer(TimedListSerializer):
+    """Сериализатор списка, загружающий связи пользователя для страницы."""
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        objects = list(data)
+        self.child.prime_viewer_relations(
+            get_viewer_relations(self.context['request']), objects)
+        return super().to_representation(objects)
+
+
 class UserSerializerMixin():
     """Миксин для сериализаторов пользователя."""
 
@@ -53,13 +77,14 @@ class UserSerializer(UserSerializerMixin,
     class Meta(UserSerializerMixin.Meta, DjoserUserSerializer.Meta):
         fields = UserSerializerMixin.Meta().fields + (
             'avatar', 'is_subscribed')
+        list_serializer_class = ViewerRelationsListSerializer
+
+    def prime_viewer_relations(self, relations, users):
+        relations.prime('subscriptions', (user.id for user in users))
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if not user.is_authenticated:
-            return False
-        return Subscriptions.objects.filter(
-            user=user, subscription=obj).exists()
+        return get_viewer_relations(self.context['request']).has(
+            'subscriptions', obj.id)
 
 
 class UserCreateSerializer(UserSerializerMixin, DjoserUserCreateSerializer):
@@ -69,45 +94,152 @@ class UserCreateSerializer(UserSerializerMixin, DjoserUserCreateSerializer):
         pass
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedDataMixin, serializers.ModelSerializer):
     """Сериализатор для работы с тегами."""
 
     class Meta():
         model = Tags
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedDataMixin, serializers.ModelSerializer):
     """Сериализатор для работы с ингредиентами."""
 
     class Meta():
         model = Ingredients
         fields = ('id', 'name', 'measurement_unit')
+        list_serializer_class = TimedListSerializer
 
 
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для работы с IngredientInRecipe."""
 
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredients.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         model = IngredientInRecipe
         fields = ('id', 'amount')
 
 
-class RecipesSerializer(serializers.ModelSerializer):
-    """Сериализатор для работы с рецептами."""
+class RecipeReadListSerializer(TimedListSerializer):
+    """Сериализатор списка рецептов, строящий страницу целиком."""
+
+    def to_representation(self, data):
+        return self.child.to_representation_many(list(data))
+
+
+class RecipeReadSerializer(TimedDataMixin, serializers.BaseSerializer):
+    """Сериализатор для чтения рецептов в списке и по одному.
+
+    Принимает строки values() с ключами id и author_id. Представления
+    без полей текущего пользователя берутся из кеша, а отсутствующие
+    собираются тремя запросами values_list() на всю страницу — рецепты
+    с авторами, теги и ингредиенты — без полей DRF и экземпляров
+    моделей. Ответ совпадает с ответом RecipesSerializer побайтно.
+    """
+
+    class Meta():
+        list_serializer_class = RecipeReadListSerializer
+
+    def _absolute_url(self, name):
+        if not name:
+            return None
+        return self.context['request'].build_absolute_uri(
+            default_storage.url(name))
+
+    def _build_representations(self, rows):
+        """Строит представления рецептов без полей текущего пользователя."""
+        ids = [row['id'] for row in rows]
+        recipes = {
+            recipe[0]: recipe for recipe in Recipes.objects.filter(
+                id__in=ids).values_list(*RECIPE_READ_COLUMNS)}
+        tags = defaultdict(list)
+        for recipe_id, id, name, slug in Recipes.tags.through.objects.filter(
+                recipes_id__in=ids).order_by('tags__name').values_list(
+                'recipes_id', 'tags__id', 'tags__name', 'tags__slug'):
+            tags[recipe_id].append({'id': id, 'name': name, 'slug': slug})
+        ingredients = defaultdict(list)
+        for recipe_id, id, name, unit, amount in (
+                IngredientInRecipe.objects.filter(recipe_id__in=ids).order_by(
+                    'ingredient__name').values_list(
+                    'recipe_id', 'ingredient_id', 'ingredient__name',
+                    'ingredient__measurement_unit', 'amount')):
+            ingredients[recipe_id].append({
+                'id': id, 'name': name, 'measurement_unit': unit,
+                'amount': amount})
+
+        representations = []
+        for id in ids:
+            (id, image, image_variants, name, text, cooking_time, author_id,
+             email, username, first_name, last_name, avatar) = recipes[id]
+            representations.append({
+                'id': id,
+                'image': self._absolute_url(image),
+                'image_variants': {
+                    format: {width: self._absolute_url(name)
+                             for width, name in names.items()}
+                    for format, names in image_variants.items()},
+                'author': {
+                    'id': author_id,
+                    'email': email,
+                    'username': username,
+                    'first_name': first_name,
+                    'last_name': last_name,
+                    'avatar': self._absolute_url(avatar),
+                    'is_subscribed': None,
+                },
+                'is_favorited': None,
+                'is_in_shopping_cart': None,
+                'name': name,
+                'text': text,
+                'cooking_time': cooking_time,
+                'tags': tags[id],
+                'ingredients': ingredients[id],
+            })
+        return representations
+
+    def to_representation_many(self, rows):
+        """Дополняет кешированные представления полями пользователя."""
+        request = self.context['request']
+        relations = get_viewer_relations(request)
+        recipes_id = [row['id'] for row in rows]
+        relations.prime('favorites', recipes_id)
+        relations.prime('shopping_cart', recipes_id)
+        relations.prime('subscriptions', (row['author_id'] for row in rows))
+        representations = get_cached_representations(
+            rows, request.build_absolute_uri('/'),
+            self._build_representations)
+        return [
+            dict(representation,
+                 author=dict(representation['author'],
+                             is_subscribed=relations.has(
+                                 'subscriptions', row['author_id'])),
+                 is_favorited=relations.has('favorites', row['id']),
+                 is_in_shopping_cart=relations.has(
+                     'shopping_cart', row['id']))
+            for row, representation in zip(rows, representations)]
+
+    def to_representation(self, row):
+        return self.to_representation_many((row,))[0]
+
+
+class RecipesSerializer(TimedDataMixin, serializers.ModelSerializer):
+    """Сериализатор для создания и изменения рецептов.
+
+    Созданный или изменённый рецепт возвращается в представлении
+    RecipeReadSerializer.
+    """
 
     image = Base64ImageField(required=True, allow_null=True)
-    author = UserSerializer(read_only=True)
     ingredients = IngredientInRecipeSerializer(many=True, write_only=True)
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta():
         model = Recipes
-        fields = '__all__'
+        fields = ('image', 'ingredients', 'name', 'text', 'cooking_time',
+                  'tags')
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredient_id_amount = validated_data.pop('ingredients')
@@ -115,41 +247,35 @@ class RecipesSerializer(serializers.ModelSerializer):
 
         recipe.tags.set(tags)
         create_M2M_recipe_field(recipe, ingredient_id_amount)
+        schedule_image_variants(recipe)
+        schedule_similar_update(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         if self.context['request'].user != instance.author:
             raise PermissionDenied()
 
         tags = validated_data.pop('tags')
         ingredient_id_amount = validated_data.pop('ingredients')
+        if 'image' in validated_data:
+            validated_data['image_variants'] = {}
         recipe = super().update(instance, validated_data)
 
+        # Похожие рецепты зависят только от наборов тегов и ингредиентов.
+        tags_changed = {tag.pk for tag in tags} != set(
+            recipe.tags.values_list('pk', flat=True))
         recipe.tags.set(tags)
-        recipe.ingredients.clear()
-        create_M2M_recipe_field(recipe, ingredient_id_amount)
+        if (update_M2M_recipe_field(recipe, ingredient_id_amount)
+                or tags_changed):
+            schedule_similar_update(recipe)
+        if 'image' in validated_data:
+            schedule_image_variants(recipe)
         return recipe
 
-    def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        if not user.is_authenticated:
-            return False
-        return Favorites.objects.filter(
-            user=user, recipe=obj).exists()
-
-    def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        if not user.is_authenticated:
-            return False
-        return ShoppingCart.objects.filter(
-            user=user, recipe=obj).exists()
-
     def to_representation(self, recipe):
-        representation = super().to_representation(recipe)
-        representation['tags'] = recipe.tags.all().values()
-        representation['ingredients'] = recipe.ingredients.annotate(
-            amount=F('ingredientinrecipe__amount')).all().values()
-        return representation
+        return RecipeReadSerializer(context=self.context).to_representation(
+            {'id': recipe.id, 'author_id': recipe.author_id})
 
     def validate_ingredients(self, ingredients):
         if not ingredients:
@@ -164,6 +290,14 @@ class RecipesSerializer(serializers.ModelSerializer):
                           for ingredient in self.initial_data['ingredients']]
         if len(ingredients_id) != len(set(ingredients_id)):
             raise serializers.ValidationError("Дублирование ингредиентов.")
+        existing_id = Ingredients.objects.filter(
+            id__in=[ingredient['id'] for ingredient in ingredients]
+        ).values_list('id', flat=True)
+        missing_id = {ingredient['id']
+                      for ingredient in ingredients} - set(existing_id)
+        if missing_id:
+            raise serializers.ValidationError(
+                f'Ингредиенты не существуют: {sorted(missing_id)}.')
         return ingredients
 
     def validate_tags(self, tags):
@@ -180,83 +314,39 @@ class RecipesSerializer(serializers.ModelSerializer):
         return super().validate(data)
 
 
-class SubscriptionsSerializer(serializers.Serializer):
-    """Сериализатор для работы с подписками пользователей."""
+class RecipeShortSerializer(TimedDataMixin, serializers.ModelSerializer):
+    """Сериализатор краткой информации о рецепте."""
 
-    user = UserSerializer(read_only=True)
-    subscription = UserSerializer(read_only=True)
+    image = Base64ImageField(read_only=True)
 
     class Meta():
-        model = Subscriptions
-        fields = ('user', 'subscription',)
-
-    def to_internal_value(self, data):
-        data['user'] = User.objects.get(id=data['user'])
-        data['subscription'] = User.objects.get(id=data['subscription'])
-        return super().to_internal_value(data)
-
-    def create(self, validated_data):
-        return Subscriptions.objects.create(
-            user=self.initial_data['user'],
-            subscription=self.initial_data['subscription'])
-
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        recipes = instance.subscription.recipes.all().values(
-            'id', 'name', 'image', 'cooking_time')
-        recipes_count = len(recipes)
-
-        recipes_limit = self._context['request'].GET.get('recipes_limit')
-        if recipes_limit and int(recipes_limit) >= 0:
-            recipes = recipes[:int(recipes_limit)]
-
-        representation['subscription']['recipes'] = recipes
-        representation['subscription']['recipes_count'] = recipes_count
-        return representation['subscription']
+        model = Recipes
+        fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class FavoritesShoppingCartMixin(serializers.Serializer):
-    """Миксин для сериализаторов моделей Favorites и ShoppingCart."""
+class SubscriptionsSerializer(TimedDataMixin, serializers.Serializer):
+    """Сериализатор для работы с подписками пользователей."""
 
     user = UserSerializer(read_only=True)
-    recipe = RecipesSerializer(read_only=True)
+    subscription = UserSerializer(read_only=True)
 
     class Meta():
-        abstract = True
-        fields = ('id', 'user', 'recipe',)
-
-    def to_internal_value(self, data):
-        data['user'] = User.objects.get(id=data['user'])
-        data['recipe'] = Recipes.objects.get(id=data['recipe'])
-        return super().to_internal_value(data)
+        model = Subscriptions
+        fields = ('user', 'subscription',)
+        list_serializer_class = ViewerRelationsListSerializer
 
-    def create(self, validated_data):
-        model = self.Meta.model
-        return model.objects.create(user=self.initial_data['user'],
-                                    recipe=self.initial_data['recipe'])
+    def prime_viewer_relations(self, relations, subscriptions):
+        relations.prime('subscriptions', (
+            subscription.subscription_id for subscription in subscriptions))
 
     def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        model = self.Meta.model
-        favorite = model.objects.values().get(user=instance.user,
-                                              recipe=instance.recipe)
-        required_fields = ('name', 'image', 'cooking_time')
-        representation['recipe'] = {
-            k: v for k, v in representation['recipe'].items()
-            if k in required_fields}
-        representation['recipe']['id'] = favorite['id']
-        return representation['recipe']
-
-
-class FavoritesSerializer(FavoritesShoppingCartMixin):
-    """Сериализатор для работы с избранными рецептами пользователей."""
-
-    class Meta(FavoritesShoppingCartMixin.Meta):
-        model = Favorites
-
-
-class ShoppingCartSerializer(FavoritesShoppingCartMixin):
-    """Сериализатор для работы со списком покупок пользователей."""
-
-    class Meta(FavoritesShoppingCartMixin.Meta):
-        model = ShoppingCart
+        representation = self.fields['subscription'].to_representation(
+            instance.subscription)
+        representation['recipes'] = [
+            {'id': recipe.id,
+             'name': recipe.name,
+             'image': recipe.image.name,
+             'cooking_time': recipe.cooking_time}
+            for recipe in instance.subscription.limited_recipes]
+        representation['recipes_count'] = instance.subscription.recipes_count
+        return representation
@@ -0,0 +1,125 @@
+import atexit
+import logging
+import secrets
+import string
+import threading
+from typing import Optional
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from constants import (SHORT_LINK_CACHE_SIZE, SHORT_LINK_FLUSH_INTERVAL,
+                       SHORT_LINK_LENGTH)
+from recipes.models import ShortLink
+from .async_views import database_sync_to_async
+from .lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+ALPHABET = string.digits + string.ascii_letters
+CODE_ATTEMPTS = 5
+
+
+def generate_code() -> str:
+    return ''.join(
+        secrets.choice(ALPHABET) for _ in range(SHORT_LINK_LENGTH))
+
+
+def get_short_link_code(recipe_id: int) -> str:
+    """Возвращает код короткой ссылки рецепта, создавая его при нужде.
+
+    Уникальность кода и рецепта обеспечивают индексы таблицы: при
+    совпадении кода он генерируется заново, а при одновременном создании
+    ссылки на тот же рецепт возвращается уже сохранённый код.
+    """
+    for _ in range(CODE_ATTEMPTS):
+        code = ShortLink.objects.filter(recipe_id=recipe_id).values_list(
+            'code', flat=True).first()
+        if code is not None:
+            return code
+        try:
+            with transaction.atomic():
+                return ShortLink.objects.create(
+                    recipe_id=recipe_id, code=generate_code()).code
+        except IntegrityError:
+            continue
+    raise IntegrityError('Не удалось подобрать свободный код ссылки.')
+
+
+class HitCounter:
+    """Накапливает переходы по ссылкам и записывает их пачками.
+
+    Первый переход в пустом буфере запускает таймер, и через interval
+    секунд буфер записывается в отдельном потоке. Редирект никогда не ждёт
+    обращения к базе, а переходы не задерживаются в буфере дольше interval
+    секунд, даже если новых переходов нет. При аварийном завершении
+    процесса теряются переходы не более чем за interval секунд.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def add(self, link_id: int) -> None:
+        with self._lock:
+            first = not self._hits
+            self._hits[link_id] = self._hits.get(link_id, 0) + 1
+        if first:
+            timer = threading.Timer(self.interval, self._flush_in_thread)
+            timer.daemon = True
+            timer.start()
+
+    def _flush_in_thread(self) -> None:
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self) -> None:
+        with self._lock:
+            hits, self._hits = self._hits, {}
+        try:
+            for link_id, count in hits.items():
+                ShortLink.objects.filter(pk=link_id).update(
+                    hits=F('hits') + count)
+        except Exception:
+            logger.exception('Не удалось записать переходы по ссылкам')
+
+
+short_link_cache = LRUCache(SHORT_LINK_CACHE_SIZE)
+hit_counter = HitCounter(SHORT_LINK_FLUSH_INTERVAL)
+atexit.register(hit_counter.flush)
+
+
+def _load_short_link(code: str) -> Optional[tuple[int, int]]:
+    entry = ShortLink.objects.filter(code=code).values_list(
+        'pk', 'recipe_id').first()
+    if entry is not None:
+        short_link_cache.set(code, entry)
+    return entry
+
+
+def _count_hit(entry: Optional[tuple[int, int]]) -> Optional[int]:
+    if entry is None:
+        return None
+    link_id, recipe_id = entry
+    hit_counter.add(link_id)
+    return recipe_id
+
+
+def resolve_short_link(code: str) -> Optional[int]:
+    """Возвращает id рецепта по коду и учитывает переход."""
+    return _count_hit(
+        short_link_cache.get(code) or _load_short_link(code))
+
+
+async def aresolve_short_link(code: str) -> Optional[int]:
+    """Асинхронный вариант resolve_short_link.
+
+    Код из кеша разрешается без перехода в поток, к базе обращается
+    только промах кеша.
+    """
+    return _count_hit(
+        short_link_cache.get(code)
+        or await database_sync_to_async(_load_short_link)(code))
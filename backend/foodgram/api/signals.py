@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (IngredientInRecipe, Ingredients, Recipes,
+                            ShortLink, Tags)
+from .authentication import invalidate_tokens
+from .catalog import bump_catalog_version
+from .feed import schedule_fan_out
+from .recipe_cache import bump_recipe_version, bump_user_version
+from .search import register_sqlite_functions
+from .short_links import short_link_cache
+from .telemetry import record_query
+
+
+@receiver((post_save, post_delete), sender=Ingredients)
+def bump_ingredients_version(**kwargs):
+    bump_catalog_version('ingredients')
+
+
+@receiver((post_save, post_delete), sender=Tags)
+def bump_tags_version(**kwargs):
+    bump_catalog_version('tags')
+
+
+@receiver(post_delete, sender=ShortLink)
+def forget_short_link(instance, **kwargs):
+    short_link_cache.discard(instance.code)
+
+
+@receiver((post_save, post_delete), sender=Recipes)
+def bump_recipe_cache_version(instance, **kwargs):
+    bump_recipe_version(instance.pk)
+
+
+@receiver(post_save, sender=Recipes)
+def fan_out_recipe(instance, created, **kwargs):
+    if created:
+        schedule_fan_out(instance)
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def bump_recipe_ingredients_version(instance, **kwargs):
+    bump_recipe_version(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipes.tags.through)
+def bump_recipe_tags_version(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_recipe_version(instance.pk)
+        return
+    for recipe_id in pk_set or ():
+        bump_recipe_version(recipe_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def bump_author_version(instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_user_version(instance.pk)
+    invalidate_tokens(Token.objects.filter(user=instance).values_list(
+        'key', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(instance, **kwargs):
+    invalidate_tokens((instance.key,))
+
+
+@receiver(connection_created)
+def install_query_telemetry(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def install_sqlite_search_functions(connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        register_sqlite_functions(connection)
@@ -0,0 +1,361 @@
+import heapq
+import logging
+import math
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Iterable, Optional, Sequence
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Min
+
+from constants import (SIMILAR_RECIPES_COUNT,
+                       SIMILAR_RECIPES_FREQUENCIES_TIMEOUT,
+                       SIMILAR_RECIPES_MAX_POSTING, SIMILAR_RECIPES_TAG_WEIGHT)
+from recipes.models import IngredientInRecipe, Recipes, SimilarRecipe
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+FREQUENCIES_KEY = 'similar_ingredient_frequencies'
+
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='similar')
+
+
+class SimilarityIndex():
+    """Разреженная матрица рецепты × ингредиенты для поиска похожих.
+
+    Сходство — косинусная мера векторов ингредиентов с весами IDF,
+    смешанная с мерой Жаккара наборов тегов. Кандидаты ищутся по
+    инвертированному индексу ингредиентов, поэтому рецепт сравнивается
+    только с рецептами, у которых есть общие ингредиенты. Ингредиенты,
+    входящие больше чем в SIMILAR_RECIPES_MAX_POSTING рецептов, не
+    учитываются: они почти не различают рецепты, но сильнее всего
+    увеличивают число кандидатов. Если установлен NumPy, страницы
+    рецептов считаются векторно.
+    """
+
+    def __init__(self, recipe_ids: Sequence[int],
+                 ingredients: Sequence[Iterable[int]],
+                 tags: Sequence[Iterable[int]],
+                 frequencies: Optional[dict[int, int]] = None,
+                 total: Optional[int] = None):
+        ingredients = [tuple(recipe) for recipe in ingredients]
+        if frequencies is None:
+            frequencies = Counter(chain.from_iterable(ingredients))
+        total = total or len(recipe_ids)
+        self.recipe_ids = list(recipe_ids)
+        self.weights = {
+            ingredient: math.log(1 + total / frequency) ** 2
+            for ingredient, frequency in frequencies.items()
+            if frequency <= SIMILAR_RECIPES_MAX_POSTING}
+        self.features = [
+            [ingredient for ingredient in recipe
+             if ingredient in self.weights] for recipe in ingredients]
+        self.norms = [
+            math.sqrt(sum(self.weights[ingredient] for ingredient in recipe))
+            for recipe in self.features]
+        self.postings = defaultdict(list)
+        for position, recipe in enumerate(self.features):
+            for ingredient in recipe:
+                self.postings[ingredient].append(position)
+
+        tagsets = {}
+        self.tagsets = [tagsets.setdefault(frozenset(recipe), len(tagsets))
+                        for recipe in tags]
+        self.tag_similarity = [
+            [len(first & second) / len(first | second)
+             if first | second else 0.0 for second in tagsets]
+            for first in tagsets]
+        self._arrays = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_arrays'] = None
+        return state
+
+    def _score(self, position, candidate, dot):
+        return ((1 - SIMILAR_RECIPES_TAG_WEIGHT) * dot
+                / (self.norms[position] * self.norms[candidate])
+                + SIMILAR_RECIPES_TAG_WEIGHT * self.tag_similarity[
+                    self.tagsets[position]][self.tagsets[candidate]])
+
+    def scores(self, position: int) -> dict[int, float]:
+        """Возвращает сходство рецепта со всеми кандидатами по позициям."""
+        dots = defaultdict(float)
+        for ingredient in self.features[position]:
+            weight = self.weights[ingredient]
+            for candidate in self.postings[ingredient]:
+                dots[candidate] += weight
+        dots.pop(position, None)
+        return {candidate: self._score(position, candidate, dot)
+                for candidate, dot in dots.items()}
+
+    def top(self, positions: Sequence[int],
+            count: int = SIMILAR_RECIPES_COUNT) -> list[tuple]:
+        """Возвращает пары (id рецепта, [(id похожего, сходство)])."""
+        if np is not None:
+            return self._top_vectorized(positions, count)
+        return [
+            (self.recipe_ids[position],
+             [(self.recipe_ids[candidate], score)
+              for score, candidate in heapq.nlargest(count, (
+                  (score, candidate) for candidate, score
+                  in self.scores(position).items()))])
+            for position in positions]
+
+    def _get_arrays(self):
+        if self._arrays is None:
+            features = sorted(self.postings)
+            feature_index = {ingredient: index
+                             for index, ingredient in enumerate(features)}
+            self._arrays = {
+                'recipe_ptr': np.cumsum(
+                    [0] + [len(recipe) for recipe in self.features]),
+                'recipe_features': np.array(
+                    [feature_index[ingredient]
+                     for recipe in self.features for ingredient in recipe],
+                    dtype=np.int64),
+                'feature_ptr': np.cumsum(
+                    [0] + [len(self.postings[ingredient])
+                           for ingredient in features]),
+                'feature_recipes': np.array(
+                    [position for ingredient in features
+                     for position in self.postings[ingredient]],
+                    dtype=np.int64),
+                'weights': np.array(
+                    [self.weights[ingredient] for ingredient in features]),
+                'norms': np.array(self.norms),
+                'tagsets': np.array(self.tagsets, dtype=np.int64),
+                'tag_similarity': np.array(self.tag_similarity),
+                'recipe_ids': np.array(self.recipe_ids, dtype=np.int64),
+            }
+        return self._arrays
+
+    @staticmethod
+    def _ranges(starts, lengths):
+        """Склеивает диапазоны [start, start + length) в один массив."""
+        offsets = np.cumsum(lengths) - lengths
+        return (np.repeat(starts - offsets, lengths)
+                + np.arange(lengths.sum()))
+
+    def _top_vectorized(self, positions, count):
+        arrays = self._get_arrays()
+        positions = np.asarray(positions, dtype=np.int64)
+        lengths = (arrays['recipe_ptr'][positions + 1]
+                   - arrays['recipe_ptr'][positions])
+        owners = np.repeat(np.arange(len(positions)), lengths)
+        features = arrays['recipe_features'][
+            self._ranges(arrays['recipe_ptr'][positions], lengths)]
+        frequencies = (arrays['feature_ptr'][features + 1]
+                       - arrays['feature_ptr'][features])
+        candidates = arrays['feature_recipes'][
+            self._ranges(arrays['feature_ptr'][features], frequencies)]
+        owners = np.repeat(owners, frequencies)
+        contributions = np.repeat(arrays['weights'][features], frequencies)
+
+        size = len(self.recipe_ids)
+        keys, inverse = np.unique(owners * size + candidates,
+                                  return_inverse=True)
+        dots = np.bincount(inverse.ravel(), weights=contributions)
+        owners, candidates = np.divmod(keys, size)
+        recipes = positions[owners]
+        keep = candidates != recipes
+        owners, candidates, recipes, dots = (
+            owners[keep], candidates[keep], recipes[keep], dots[keep])
+        scores = ((1 - SIMILAR_RECIPES_TAG_WEIGHT) * dots
+                  / (arrays['norms'][recipes] * arrays['norms'][candidates])
+                  + SIMILAR_RECIPES_TAG_WEIGHT * arrays['tag_similarity'][
+                      arrays['tagsets'][recipes],
+                      arrays['tagsets'][candidates]])
+
+        order = np.lexsort((-candidates, -scores, owners))
+        owners, candidates, scores = (
+            owners[order], candidates[order], scores[order])
+        ranks = np.arange(len(owners)) - np.searchsorted(owners, owners)
+        keep = ranks < count
+        owners, candidates, scores = (
+            owners[keep], candidates[keep], scores[keep])
+        similar = [[] for _ in positions]
+        for owner, candidate, score in zip(
+                owners.tolist(),
+                arrays['recipe_ids'][candidates].tolist(),
+                scores.tolist()):
+            similar[owner].append((candidate, score))
+        return list(zip(
+            arrays['recipe_ids'][positions].tolist(), similar))
+
+
+def get_frequencies() -> tuple[dict[int, int], int]:
+    """Возвращает число рецептов с каждым ингредиентом и число рецептов.
+
+    Подсчёт группирует всю таблицу ингредиентов рецептов, поэтому
+    результат кешируется на SIMILAR_RECIPES_FREQUENCIES_TIMEOUT секунд
+    и обновляется полным пересчётом в load_index. Веса IDF от
+    отдельных правок почти не меняются.
+    """
+    cached = cache.get(FREQUENCIES_KEY)
+    if cached is None:
+        cached = (dict(IngredientInRecipe.objects.order_by().values(
+            'ingredient_id').annotate(total=Count('id')).values_list(
+            'ingredient_id', 'total')), Recipes.objects.count())
+        cache.set(FREQUENCIES_KEY, cached,
+                  SIMILAR_RECIPES_FREQUENCIES_TIMEOUT)
+    return cached
+
+
+def load_index() -> SimilarityIndex:
+    """Загружает ингредиенты и теги всех рецептов в индекс."""
+    recipe_ids = list(Recipes.objects.order_by('id').values_list(
+        'id', flat=True))
+    ingredients, tags = defaultdict(list), defaultdict(list)
+    for recipe_id, ingredient_id in IngredientInRecipe.objects.values_list(
+            'recipe_id', 'ingredient_id').iterator():
+        ingredients[recipe_id].append(ingredient_id)
+    for recipe_id, tag_id in Recipes.tags.through.objects.values_list(
+            'recipes_id', 'tags_id').iterator():
+        tags[recipe_id].append(tag_id)
+    cache.set(FREQUENCIES_KEY, (
+        dict(Counter(chain.from_iterable(ingredients.values()))),
+        len(recipe_ids)), SIMILAR_RECIPES_FREQUENCIES_TIMEOUT)
+    return SimilarityIndex(
+        recipe_ids, [ingredients[recipe_id] for recipe_id in recipe_ids],
+        [tags[recipe_id] for recipe_id in recipe_ids])
+
+
+_worker_index = None
+
+
+def init_worker(index: SimilarityIndex) -> None:
+    """Передаёт индекс процессу пула при его запуске."""
+    global _worker_index
+    _worker_index = index
+
+
+def top_in_worker(positions: Sequence[int]) -> list[tuple]:
+    return _worker_index.top(positions)
+
+
+def update_similar_recipes(recipe_id: int) -> None:
+    """Пересчитывает похожие рецепты после изменения одного рецепта.
+
+    Для рецепта заново считаются его похожие. В списках, где он уже
+    есть, обновляется только его оценка, а из списков рецептов, у
+    которых не осталось с ним общих ингредиентов, он удаляется. В
+    остальные списки кандидатов он вставляется, если вытесняет из них
+    наименее похожий. Частоты ингредиентов берутся из get_frequencies.
+    Если изменение понизило сходство, в списках других рецептов может
+    остаться меньше SIMILAR_RECIPES_COUNT записей или запись, уже не
+    входящая в лучшие, до следующего полного пересчёта командой
+    build_similar_recipes.
+    """
+    ingredients = list(IngredientInRecipe.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', flat=True))
+    frequencies, total = get_frequencies()
+    candidate_ids = set(IngredientInRecipe.objects.filter(
+        ingredient_id__in=[
+            ingredient for ingredient in ingredients
+            if frequencies.get(ingredient, 0) <= SIMILAR_RECIPES_MAX_POSTING
+        ]).values_list('recipe_id', flat=True)) | {recipe_id}
+    recipe_ids = sorted(candidate_ids)
+    recipe_ingredients, recipe_tags = defaultdict(list), defaultdict(list)
+    for candidate, ingredient in IngredientInRecipe.objects.filter(
+            recipe_id__in=recipe_ids).values_list(
+            'recipe_id', 'ingredient_id'):
+        recipe_ingredients[candidate].append(ingredient)
+    for candidate, tag in Recipes.tags.through.objects.filter(
+            recipes_id__in=recipe_ids).values_list('recipes_id', 'tags_id'):
+        recipe_tags[candidate].append(tag)
+    # Ингредиенты, которых ещё нет в кешированных частотах, учитываются
+    # по встречаемости среди кандидатов.
+    frequencies = {
+        **Counter(chain.from_iterable(recipe_ingredients.values())),
+        **frequencies}
+    index = SimilarityIndex(
+        recipe_ids, [recipe_ingredients[id] for id in recipe_ids],
+        [recipe_tags[id] for id in recipe_ids], frequencies,
+        max(total, len(recipe_ids)))
+
+    position = recipe_ids.index(recipe_id)
+    scores = {recipe_ids[candidate]: score
+              for candidate, score in index.scores(position).items()}
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id=recipe_id).delete()
+        [(_, similar)] = index.top((position,))
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                          score=score) for similar_id, score in similar)
+
+        kept, stale = [], []
+        for entry in SimilarRecipe.objects.filter(
+                similar_id=recipe_id).only('recipe_id', 'score'):
+            if entry.recipe_id in scores:
+                entry.score = scores.pop(entry.recipe_id)
+                kept.append(entry)
+            else:
+                stale.append(entry.pk)
+        if stale:
+            SimilarRecipe.objects.filter(pk__in=stale).delete()
+        if kept:
+            SimilarRecipe.objects.bulk_update(kept, ('score',))
+
+        lists = SimilarRecipe.objects.filter(
+            recipe_id__in=scores).order_by().values('recipe_id').annotate(
+            total=Count('id'), lowest=Min('score')).values_list(
+            'recipe_id', 'total', 'lowest')
+        lists = {candidate: (total, lowest)
+                 for candidate, total, lowest in lists}
+        inserted, full = [], False
+        for candidate, score in scores.items():
+            total, lowest = lists.get(candidate, (0, 0.0))
+            if total < SIMILAR_RECIPES_COUNT:
+                inserted.append(candidate)
+            elif score > lowest:
+                inserted.append(candidate)
+                full = True
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe_id=candidate, similar_id=recipe_id,
+                          score=scores[candidate]) for candidate in inserted)
+        if full:
+            trim_similar_lists(recipe_id)
+
+
+def trim_similar_lists(recipe_id: int) -> None:
+    """Обрезает списки похожих, где есть recipe_id, до лучших записей.
+
+    В каждом списке остаются SIMILAR_RECIPES_COUNT записей. Лишние
+    записи всех таких списков удаляются одним запросом с ROW_NUMBER()
+    по спискам, а не отдельным запросом на каждый список.
+    """
+    table = connection.ops.quote_name(SimilarRecipe._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ('
+            f'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+            f'PARTITION BY recipe_id ORDER BY score DESC, similar_id DESC'
+            f') AS position FROM {table} WHERE recipe_id IN ('
+            f'SELECT recipe_id FROM {table} WHERE similar_id = %s)'
+            f') ranked WHERE position > %s)',
+            (recipe_id, SIMILAR_RECIPES_COUNT))
+
+
+def _update_task(recipe_id: int) -> None:
+    try:
+        if Recipes.objects.filter(pk=recipe_id).exists():
+            update_similar_recipes(recipe_id)
+    except Exception:
+        logger.exception('Не удалось пересчитать похожие рецепты для %s',
+                         recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_similar_update(recipe: Recipes) -> None:
+    """Ставит пересчёт похожих рецептов в очередь после фиксации."""
+    recipe_id = recipe.pk
+    transaction.on_commit(lambda: executor.submit(_update_task, recipe_id))
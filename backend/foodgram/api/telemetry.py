@@ -0,0 +1,218 @@
+import os
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Optional
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework import serializers
+
+from constants import TELEMETRY_DURATION_BUCKETS, TELEMETRY_QUERY_BUCKETS
+
+METRICS = {
+    'request_duration_seconds': (
+        'Полное время обработки запроса', TELEMETRY_DURATION_BUCKETS),
+    'sql_duration_seconds': (
+        'Время SQL-запросов за запрос', TELEMETRY_DURATION_BUCKETS),
+    'serializer_duration_seconds': (
+        'Время сериализации за запрос', TELEMETRY_DURATION_BUCKETS),
+    'sql_queries': (
+        'Число SQL-запросов за запрос', TELEMETRY_QUERY_BUCKETS),
+}
+
+
+class RequestStats():
+    """Показатели одного запроса."""
+
+    __slots__ = ('view', 'started', 'queries', 'sql_time',
+                 'serializer_time', 'serializer_depth')
+
+    def __init__(self):
+        self.view = 'unresolved'
+        self.started = perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+
+current_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    'current_stats', default=None)
+
+
+class Histograms():
+    """Гистограммы показателей по представлениям в памяти процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, view: str, values: dict) -> None:
+        with self._lock:
+            for metric, value in values.items():
+                buckets = METRICS[metric][1]
+                series = self._series.get((metric, view))
+                if series is None:
+                    series = self._series[metric, view] = [
+                        [0] * (len(buckets) + 1), 0.0]
+                series[0][bisect_left(buckets, value)] += 1
+                series[1] += value
+
+    def render(self) -> str:
+        """Возвращает гистограммы в текстовом формате Prometheus."""
+        with self._lock:
+            series = {key: (list(counts), total)
+                      for key, (counts, total) in self._series.items()}
+        pid = os.getpid()
+        lines = []
+        for metric, (description, buckets) in METRICS.items():
+            name = f'foodgram_{metric}'
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} histogram')
+            for (series_metric, view), (counts, total) in sorted(
+                    series.items()):
+                if series_metric != metric:
+                    continue
+                labels = f'view="{view}",pid="{pid}"'
+                cumulative = 0
+                for bound, count in zip(buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else bound
+                    lines.append(
+                        f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{labels}}} {total}')
+                lines.append(f'{name}_count{{{labels}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+histograms = Histograms()
+
+
+def record_query(execute, sql, params, many, context):
+    """Обёртка выполнения SQL, учитывающая запрос в текущем запросе."""
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.sql_time += perf_counter() - start
+
+
+@contextmanager
+def serializer_timer():
+    """Учитывает время сериализации; вложенные вызовы не суммируются."""
+    stats = current_stats.get()
+    if stats is None:
+        yield
+        return
+    stats.serializer_depth += 1
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializer_depth -= 1
+        if not stats.serializer_depth:
+            stats.serializer_time += perf_counter() - start
+
+
+class TimedDataMixin():
+    """Миксин сериализатора, учитывающий время получения data."""
+
+    @property
+    def data(self):
+        with serializer_timer():
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
+
+
+def get_view_name(request, view_func) -> str:
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', 'unknown')
+    method = request.method.lower()
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+def has_metrics_token(value: str) -> bool:
+    return bool(settings.METRICS_TOKEN) and constant_time_compare(
+        value, settings.METRICS_TOKEN)
+
+
+def is_metrics_client(request) -> bool:
+    """Проверяет доступ к метрикам: адрес из списка или токен Bearer."""
+    scheme, _, token = request.META.get(
+        'HTTP_AUTHORIZATION', '').partition(' ')
+    return (request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+            or scheme.lower() == 'bearer' and has_metrics_token(token))
+
+
+def show_server_timing(request) -> bool:
+    """Решает, отдавать ли клиенту заголовок Server-Timing.
+
+    Заголовок раскрывает время запросов к базе, поэтому он отдаётся только
+    в режиме отладки, персоналу или с токеном метрик в X-Server-Timing.
+    Такие ответы помечаются Cache-Control: private, чтобы общий кеш
+    не раздал их остальным клиентам.
+    """
+    if settings.DEBUG or has_metrics_token(
+            request.META.get('HTTP_X_SERVER_TIMING', '')):
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+class TelemetryMiddleware(MiddlewareMixin):
+    """Собирает показатели производительности каждого запроса.
+
+    Число и время SQL-запросов, время сериализации и общее время
+    накапливаются в гистограммах по представлениям DRF и их действиям,
+    а для доверенных клиентов отдаются и в заголовке Server-Timing.
+    """
+
+    def process_request(self, request):
+        request._telemetry = RequestStats()
+        current_stats.set(request._telemetry)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._telemetry.view = get_view_name(request, view_func)
+
+    def process_response(self, request, response):
+        stats = getattr(request, '_telemetry', None)
+        if stats is None:
+            return response
+        current_stats.set(None)
+        total = perf_counter() - stats.started
+        if show_server_timing(request):
+            response['Server-Timing'] = (
+                f'db;desc="{stats.queries} queries";'
+                f'dur={stats.sql_time * 1000:.2f}, '
+                f'serializer;dur={stats.serializer_time * 1000:.2f}, '
+                f'total;dur={total * 1000:.2f}')
+            patch_cache_control(response, private=True)
+        histograms.observe(stats.view, {
+            'request_duration_seconds': total,
+            'sql_duration_seconds': stats.sql_time,
+            'serializer_duration_seconds': stats.serializer_time,
+            'sql_queries': stats.queries,
+        })
+        return response
+
+
+def metrics(request):
+    if not is_metrics_client(request):
+        return HttpResponseForbidden()
+    return HttpResponse(histograms.render(),
+                        content_type='text/plain; version=0.0.4')
@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+User = get_user_model()
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    """Закешированный токен перестаёт действовать сразу после отзыва."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user',
+            first_name='Пользователь', last_name='Сайта', password='x')
+
+    def setUp(self):
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def _me(self):
+        return self.client.get('/api/users/me/').status_code
+
+    def test_logout(self):
+        self.assertEqual(self._me(), 200)
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self._me(), 401)
+
+    def test_deactivation(self):
+        self.assertEqual(self._me(), 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self._me(), 401)
+
+    def test_password_change(self):
+        self.assertEqual(self._me(), 200)
+        self.user.set_password('new-password')
+        self.user.save()
+        # Токен остаётся, но кеш сброшен: пользователь читается заново.
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self._me(), 200)
+        self.assertIn('authtoken_token', context.captured_queries[0]['sql'])
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self._me(), 200)
+        self.assertNotIn('authtoken_token', ' '.join(
+            query['sql'] for query in context.captured_queries))
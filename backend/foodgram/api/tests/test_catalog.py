@@ -0,0 +1,38 @@
+import gzip
+
+from rest_framework.test import APITestCase
+
+from recipes.models import Ingredients
+
+
+class IngredientCatalogTests(APITestCase):
+    """Справочник ингредиентов из сжатого снимка и его ETag."""
+
+    url = '/api/ingredients/'
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredients.objects.create(name='соль', measurement_unit='г')
+        Ingredients.objects.create(name='сахар', measurement_unit='г')
+
+    def test_encodings_have_own_etags(self):
+        plain = self.client.get(self.url, HTTP_ACCEPT_ENCODING='identity')
+        packed = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(packed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(packed.content), plain.content)
+        self.assertNotEqual(plain['ETag'], packed['ETag'])
+        for response in (plain, packed):
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_not_modified_only_for_same_encoding(self):
+        etag = self.client.get(
+            self.url, HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='identity',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
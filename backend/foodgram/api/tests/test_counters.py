@@ -0,0 +1,201 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from api.views import RecipesViewSet, UserAvatarView
+from recipes.models import (Favorites, Ingredients, Recipes, ShoppingCart,
+                            Tags)
+from subscriptions.models import Subscriptions
+
+User = get_user_model()
+
+
+def count_statements(context):
+    """Считает запросы без точек сохранения, которые добавляет TestCase."""
+    return sum(1 for query in context.captured_queries
+               if not query['sql'].startswith(
+                   ('SAVEPOINT', 'RELEASE SAVEPOINT')))
+
+
+class RecipeCounterTests(APITestCase):
+    """Счётчики избранного и списка покупок меняются вместе со строками."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='x')
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user',
+            first_name='Пользователь', last_name='Сайта', password='x')
+        cls.recipe = Recipes.objects.create(
+            author=cls.author, name='Суп', text='Сварить', cooking_time=30)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def _toggle(self, method, url):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url)
+        return response.status_code, count_statements(context)
+
+    def test_toggles_keep_counter_in_step(self):
+        for endpoint, counter in (('favorite', 'favorites_count'),
+                                  ('shopping_cart', 'shopping_cart_count')):
+            url = f'/api/recipes/{self.recipe.id}/{endpoint}/'
+            with self.subTest(endpoint=endpoint):
+                self.assertEqual(self._toggle('post', url), (201, 3))
+                self.recipe.refresh_from_db()
+                self.assertEqual(getattr(self.recipe, counter), 1)
+
+                status, _ = self._toggle('post', url)
+                self.assertEqual(status, 400)
+                self.recipe.refresh_from_db()
+                self.assertEqual(getattr(self.recipe, counter), 1)
+
+                self.assertEqual(self._toggle('delete', url), (204, 2))
+                self.recipe.refresh_from_db()
+                self.assertEqual(getattr(self.recipe, counter), 0)
+
+                status, _ = self._toggle('delete', url)
+                self.assertEqual(status, 400)
+                self.recipe.refresh_from_db()
+                self.assertEqual(getattr(self.recipe, counter), 0)
+
+    def test_missing_recipe(self):
+        for method in ('post', 'delete'):
+            with self.subTest(method=method):
+                response = getattr(self.client, method)(
+                    '/api/recipes/0/favorite/')
+                self.assertEqual(response.status_code, 404)
+
+    def test_deleted_user_releases_counters(self):
+        Favorites.objects.add(self.user, self.recipe.id)
+        ShoppingCart.objects.add(self.user, self.recipe.id)
+        Subscriptions.objects.add(self.user, self.author.id)
+        self.user.delete()
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+        self.assertEqual(self.recipe.shopping_cart_count, 0)
+        self.assertEqual(self.author.followers_count, 0)
+
+
+class ConcurrentSaveTests(APITestCase):
+    """Сохранение объекта не затирает счётчики конкурентных запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='x')
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user',
+            first_name='Пользователь', last_name='Сайта', password='x')
+        cls.recipe = Recipes.objects.create(
+            author=cls.author, name='Суп', text='Сварить', cooking_time=30)
+        cls.tag = Tags.objects.create(name='Обед', slug='lunch')
+        cls.ingredient = Ingredients.objects.create(
+            name='Капуста', measurement_unit='г')
+
+    def setUp(self):
+        self.client.force_authenticate(self.author)
+
+    def _toggle_after(self, view, toggle):
+        """Выполняет toggle сразу после чтения объекта во вьюхе."""
+        get_object = view.get_object
+
+        def get_object_then_toggle(instance):
+            obj = get_object(instance)
+            toggle()
+            return obj
+        return mock.patch.object(view, 'get_object', get_object_then_toggle)
+
+    def test_recipe_update_keeps_counters(self):
+        with self._toggle_after(RecipesViewSet, lambda: (
+                Favorites.objects.add(self.user, self.recipe.id),
+                ShoppingCart.objects.add(self.user, self.recipe.id))):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/', {
+                    'name': 'Борщ', 'tags': [self.tag.id],
+                    'ingredients': [{'id': self.ingredient.id,
+                                     'amount': 100}]},
+                format='json')
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'Борщ')
+        self.assertEqual(
+            (self.recipe.favorites_count, self.recipe.shopping_cart_count),
+            (1, 1))
+
+    def test_user_save_keeps_counters(self):
+        with self._toggle_after(UserAvatarView, lambda: (
+                Subscriptions.objects.add(self.user, self.author.id))):
+            response = self.client.delete('/api/users/me/avatar/')
+        self.assertEqual(response.status_code, 204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+
+        stale = User.objects.get(pk=self.author.pk)
+        Subscriptions.objects.remove(self.user, self.author.id)
+        stale.first_name = 'Другое'
+        stale.save()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+        self.assertEqual(self.author.first_name, 'Другое')
+
+
+class ReconcileCountersTests(APITestCase):
+    """Команда reconcile_counters исправляет разошедшиеся счётчики."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='x')
+        cls.followers = [
+            User.objects.create_user(
+                email=f'user{i}@example.com', username=f'user{i}',
+                first_name='Пользователь', last_name='Сайта', password='x')
+            for i in range(3)]
+        cls.recipe = Recipes.objects.create(
+            author=cls.author, name='Суп', text='Сварить', cooking_time=30)
+        for user in cls.followers:
+            Favorites.objects.add(user, cls.recipe.id)
+            Subscriptions.objects.add(user, cls.author.id)
+        ShoppingCart.objects.add(cls.followers[0], cls.recipe.id)
+
+    def _drift(self):
+        Recipes.objects.update(favorites_count=7, shopping_cart_count=0)
+        User.objects.filter(pk=self.author.pk).update(
+            recipes_count=0, followers_count=1)
+
+    def _counters(self):
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        return (self.recipe.favorites_count, self.recipe.shopping_cart_count,
+                self.author.recipes_count, self.author.followers_count)
+
+    def test_counters_match_rows(self):
+        self.assertEqual(self._counters(), (3, 1, 1, 3))
+
+    def test_dry_run_only_reports(self):
+        self._drift()
+        output = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=output)
+        self.assertIn('recipes.Recipes.favorites_count: расхождений 1',
+                      output.getvalue())
+        self.assertEqual(self._counters(), (7, 0, 0, 1))
+
+    def test_repairs_drift(self):
+        self._drift()
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(self._counters(), (3, 1, 1, 3))
+        output = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=output)
+        self.assertNotIn('расхождений 1', output.getvalue())
@@ -0,0 +1,95 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from api.feed import backfill, clear, fan_out
+from recipes.models import Recipes
+from subscriptions.models import Subscriptions, TimelineEntry
+
+User = get_user_model()
+
+
+class FeedTests(APITestCase):
+    """Лента рецептов авторов, на которых подписан пользователь."""
+
+    url = '/api/recipes/feed/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author, cls.other = (
+            User.objects.create_user(
+                email=f'{name}@example.com', username=name,
+                first_name='Имя', last_name='Фамилия', password='x')
+            for name in ('user', 'author', 'other'))
+        for i in range(7):
+            Recipes.objects.create(
+                author=(cls.author, cls.other)[i % 2], name=f'Рецепт {i}',
+                text='Описание', cooking_time=5)
+        for author in (cls.author, cls.other):
+            Subscriptions.objects.add(cls.user, author.id)
+            backfill(cls.user.id, author.id)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def _pages(self, url):
+        ids = []
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids += [recipe['id'] for recipe in data['results']]
+            url = data['next']
+        return ids
+
+    def test_pages_follow_before(self):
+        expected = list(Recipes.objects.order_by('-id').values_list(
+            'id', flat=True))
+        self.assertEqual(self._pages(f'{self.url}?limit=3'), expected)
+        response = self.client.get(self.url, {'limit': 'abc'})
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_invalid_before(self):
+        for before in ('abc', '0', '-1'):
+            with self.subTest(before=before):
+                response = self.client.get(self.url, {'before': before})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('before', response.json())
+
+    def test_anonymous(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_new_recipe_is_fanned_out(self):
+        with mock.patch('api.signals.schedule_fan_out') as schedule:
+            recipe = Recipes.objects.create(
+                author=self.author, name='Новый', text='Описание',
+                cooking_time=5)
+        schedule.assert_called_once_with(recipe)
+        self.assertEqual(fan_out(recipe.id, self.author.id), 1)
+        # Повторная раскладка не создаёт дублей, но учитывает попытку.
+        self.assertEqual(fan_out(recipe.id, self.author.id), 1)
+        self.assertEqual(TimelineEntry.objects.filter(
+            recipe=recipe).count(), 1)
+        self.assertEqual(self._pages(self.url)[0], recipe.id)
+
+    def test_clear_on_unsubscribe(self):
+        self.assertEqual(clear(self.user.id, self.author.id), 4)
+        expected = list(Recipes.objects.filter(author=self.other).order_by(
+            '-id').values_list('id', flat=True))
+        self.assertEqual(self._pages(self.url), expected)
+
+    @mock.patch('api.feed.FEED_FAN_OUT_LIMIT', 0)
+    def test_huge_author_is_read_from_recipes(self):
+        TimelineEntry.objects.filter(author=self.author).delete()
+        recipe = Recipes.objects.create(
+            author=self.author, name='Новый', text='Описание',
+            cooking_time=5)
+        self.assertEqual(fan_out(recipe.id, self.author.id), 0)
+        self.assertEqual(backfill(self.user.id, self.author.id), 0)
+        expected = list(Recipes.objects.order_by('-id').values_list(
+            'id', flat=True))
+        self.assertEqual(self._pages(f'{self.url}?limit=3'), expected)
@@ -0,0 +1,64 @@
+import base64
+import os
+import textwrap
+from io import BytesIO
+
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APISimpleTestCase
+
+from api.fields import BASE64_CHUNK_SIZE, Base64ImageField
+from constants import MAX_IMAGE_SIDE
+
+
+def png(width, height, noise=False):
+    if noise:
+        image = Image.frombytes('RGB', (width, height),
+                                os.urandom(width * height * 3))
+    else:
+        image = Image.new('RGB', (width, height), (200, 120, 60))
+    buffer = BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def data_uri(content, wrap=None):
+    encoded = base64.b64encode(content).decode()
+    if wrap:
+        encoded = '\r\n'.join(textwrap.wrap(encoded, wrap))
+    return f'data:image/png;base64,{encoded}'
+
+
+class Base64ImageFieldTests(APISimpleTestCase):
+    """Поле изображения base64, декодируемого частями."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Шум не сжимается, поэтому строка длиннее нескольких частей.
+        cls.large = png(400, 400, noise=True)
+
+    def _decode(self, data):
+        file = Base64ImageField().to_internal_value(data)
+        with file:
+            return file.read()
+
+    def test_chunked_string(self):
+        self.assertGreater(len(data_uri(self.large)), 2 * BASE64_CHUNK_SIZE)
+        self.assertEqual(self._decode(data_uri(self.large)), self.large)
+
+    def test_line_wrapped_string(self):
+        for wrap in (76, 64):
+            with self.subTest(wrap=wrap):
+                self.assertEqual(
+                    self._decode(data_uri(self.large, wrap)), self.large)
+
+    def test_invalid_base64(self):
+        with self.assertRaises(ValidationError) as context:
+            self._decode(data_uri(self.large)[:-1])
+        self.assertEqual(context.exception.detail[0].code, 'invalid_base64')
+
+    def test_too_large_image(self):
+        with self.assertRaises(ValidationError) as context:
+            self._decode(data_uri(png(MAX_IMAGE_SIDE + 1, 1), 76))
+        self.assertEqual(context.exception.detail[0].code, 'too_large')
@@ -0,0 +1,107 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from recipes.models import (Favorites, IngredientInRecipe, Ingredients,
+                            Recipes, ShoppingCart, Tags)
+from subscriptions.models import Subscriptions
+
+User = get_user_model()
+
+RECIPES_COUNT = 60
+
+# Рецепты без данных пользователя: COUNT страницы, строки страницы,
+# рецепты с авторами, теги, ингредиенты.
+ANONYMOUS_LIST_QUERIES = 5
+# Плюс по запросу на избранное, список покупок и подписки.
+AUTHENTICATED_LIST_QUERIES = ANONYMOUS_LIST_QUERIES + 3
+# Строка рецепта вместо COUNT и страницы.
+ANONYMOUS_DETAIL_QUERIES = 4
+AUTHENTICATED_DETAIL_QUERIES = ANONYMOUS_DETAIL_QUERIES + 3
+
+
+class RecipeQueryBudgetTests(APITestCase):
+    """Число запросов списка и карточки рецепта не зависит от их размера."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='x')
+        cls.viewer = User.objects.create_user(
+            email='viewer@example.com', username='viewer',
+            first_name='Читатель', last_name='Рецептов', password='x')
+        tags = [Tags.objects.create(name=f'Тег {i}', slug=f'tag-{i}')
+                for i in range(3)]
+        ingredients = [
+            Ingredients.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(5)]
+        for i in range(RECIPES_COUNT):
+            recipe = Recipes.objects.create(
+                author=cls.author, name=f'Рецепт {i}', text='Описание',
+                cooking_time=10)
+            recipe.tags.set(tags[:1 + i % len(tags)])
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(recipe=recipe, ingredient=ingredient,
+                                   amount=i + 1)
+                for ingredient in ingredients[:1 + i % len(ingredients)])
+            if i % 2:
+                Favorites.objects.create(user=cls.viewer, recipe=recipe)
+            if i % 3:
+                ShoppingCart.objects.create(user=cls.viewer, recipe=recipe)
+        Subscriptions.objects.create(user=cls.viewer, subscription=cls.author)
+        cls.recipe = Recipes.objects.order_by('-id').first()
+
+    def setUp(self):
+        # Холодный кеш представлений: проверяется худший случай.
+        cache.clear()
+
+    def _count_queries(self, url):
+        reset_queries()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context), response.json()
+
+    def _assert_list_budget(self, expected):
+        for limit in (5, 50):
+            cache.clear()
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(expected):
+                    response = self.client.get(
+                        '/api/recipes/', {'limit': limit})
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_anonymous_list(self):
+        self._assert_list_budget(ANONYMOUS_LIST_QUERIES)
+
+    def test_authenticated_list(self):
+        self.client.force_authenticate(self.viewer)
+        self._assert_list_budget(AUTHENTICATED_LIST_QUERIES)
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        self.client.force_authenticate(self.viewer)
+        small, _ = self._count_queries('/api/recipes/?limit=5')
+        cache.clear()
+        large, data = self._count_queries('/api/recipes/?limit=50')
+        self.assertEqual(small, large)
+        self.assertTrue(any(recipe['is_favorited']
+                            for recipe in data['results']))
+        self.assertTrue(all(recipe['author']['is_subscribed']
+                            for recipe in data['results']))
+
+    def test_anonymous_detail(self):
+        with self.assertNumQueries(ANONYMOUS_DETAIL_QUERIES):
+            response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_authenticated_detail(self):
+        self.client.force_authenticate(self.viewer)
+        for recipe in Recipes.objects.order_by('id')[:3]:
+            with self.subTest(recipe=recipe.id):
+                with self.assertNumQueries(AUTHENTICATED_DETAIL_QUERIES):
+                    response = self.client.get(f'/api/recipes/{recipe.id}/')
+                self.assertEqual(response.status_code, 200)
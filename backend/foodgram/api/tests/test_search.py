@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipes
+
+User = get_user_model()
+
+
+class RecipeSearchTests(APITestCase):
+    """Поиск рецептов по названию и описанию и его сочетание с курсором."""
+
+    url = '/api/recipes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='x')
+        for name, text in (('Капуста тушеная', 'Потушить с морковью'),
+                           ('Суп', 'Сварить, капуста по вкусу'),
+                           ('Щи', 'Капуста, свёкла и картофель'),
+                           ('Омлет', 'Взбить яйца')):
+            Recipes.objects.create(author=author, name=name, text=text,
+                                   cooking_time=30)
+
+    def setUp(self):
+        cache.clear()
+
+    def _names(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.json()['results']]
+
+    def test_rank_and_case(self):
+        for query in ('Капуста', 'капуста', 'КАПУСТ'):
+            with self.subTest(query=query):
+                self.assertEqual(self._names({'search': query}),
+                                 ['Капуста тушеная', 'Щи', 'Суп'])
+        self.assertEqual(self._names({'search': 'щи'}), ['Щи'])
+        self.assertEqual(self._names({'search': 'свекла капуста'}), ['Щи'])
+        self.assertEqual(self._names({'search': 'борщ'}), [])
+
+    def test_cursor_keeps_id_order(self):
+        names = self._names({'cursor': ''})
+        self.assertEqual(names, ['Омлет', 'Щи', 'Суп', 'Капуста тушеная'])
+
+    def test_cursor_rejects_other_orderings(self):
+        for params in ({'search': 'капуста'}, {'ordering': 'popular'}):
+            with self.subTest(params=params):
+                response = self.client.get(
+                    self.url, {**params, 'cursor': ''})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('cursor', response.json())
@@ -0,0 +1,71 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipes, ShortLink
+from api.short_links import HitCounter, hit_counter, short_link_cache
+
+User = get_user_model()
+
+
+class ShortLinkTests(APITestCase):
+    """Короткие ссылки на рецепты и учёт переходов по ним."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='x')
+        cls.recipe = Recipes.objects.create(
+            author=author, name='Суп', text='Сварить', cooking_time=30)
+
+    def tearDown(self):
+        hit_counter.flush()
+
+    def _get_code(self):
+        response = self.client.get(f'/api/recipes/{self.recipe.id}/get-link/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['short-link'].rstrip('/').rsplit('/', 1)[-1]
+
+    def test_link_is_stable(self):
+        code = self._get_code()
+        self.assertEqual(self._get_code(), code)
+        self.assertEqual(ShortLink.objects.get(recipe=self.recipe).code, code)
+
+    def test_missing_recipe(self):
+        response = self.client.get('/api/recipes/0/get-link/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_redirect_counts_hits(self):
+        code = self._get_code()
+        short_link_cache.discard(code)
+        for _ in range(3):
+            response = self.client.get(f'/s/{code}/')
+            self.assertRedirects(response, f'/recipes/{self.recipe.id}/',
+                                 fetch_redirect_response=False)
+        hit_counter.flush()
+        self.assertEqual(ShortLink.objects.get(code=code).hits, 3)
+
+    def test_unknown_code(self):
+        self.assertEqual(self.client.get('/s/unknown/').status_code, 404)
+        self.assertEqual(self.client.post('/s/unknown/').status_code, 405)
+
+    def test_legacy_link(self):
+        response = self.client.get(f'/rcp/{self.recipe.id}/')
+        self.assertRedirects(response, f'/recipes/{self.recipe.id}/',
+                             fetch_redirect_response=False)
+        self.assertEqual(self.client.get('/rcp/0/').status_code, 404)
+
+
+class HitCounterTests(APITestCase):
+    """Буфер переходов записывается по таймеру без новых переходов."""
+
+    def test_idle_buffer_is_flushed(self):
+        counter = HitCounter(interval=0.01)
+        flushed = threading.Event()
+        with mock.patch.object(counter, 'flush', side_effect=flushed.set):
+            counter.add(1)
+            counter.add(2)
+            self.assertTrue(flushed.wait(1))
@@ -0,0 +1,170 @@
+from io import StringIO
+from unittest import mock
+
+from django.db.models import Count
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from api.similar import update_similar_recipes
+from api.tests.test_counters import count_statements
+from recipes.models import (IngredientInRecipe, Ingredients, Recipes,
+                            SimilarRecipe, Tags)
+
+User = get_user_model()
+
+# Ингредиенты, кандидаты, их ингредиенты и теги; список рецепта: удаление
+# и вставка; записи рецепта у соседей: чтение и обновление оценок;
+# заполненность списков, вставка и одно удаление лишних записей.
+UPDATE_STATEMENTS = 11
+
+
+class SimilarRecipesTests(APITestCase):
+    """Похожие рецепты: полный расчёт, пересчёт одного рецепта и API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='x')
+        cls.tags = [Tags.objects.create(name=f'Тег {i}', slug=f'tag-{i}')
+                    for i in range(2)]
+        cls.ingredients = [
+            Ingredients.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(8)]
+        cls.recipes = []
+        for i in range(6):
+            recipe = Recipes.objects.create(
+                author=cls.author, name=f'Рецепт {i}', text='Описание',
+                cooking_time=10)
+            recipe.tags.set(cls.tags[i % 2:i % 2 + 1])
+            for ingredient in cls.ingredients[i:i + 3]:
+                IngredientInRecipe.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=1)
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        call_command('build_similar_recipes', '--workers', '1',
+                     stdout=StringIO())
+
+    def _similar(self, recipe):
+        return list(SimilarRecipe.objects.filter(recipe=recipe).order_by(
+            '-score', '-similar_id').values_list('similar_id', 'score'))
+
+    def test_endpoint(self):
+        recipe = self.recipes[2]
+        response = self.client.get(f'/api/recipes/{recipe.id}/similar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.json()],
+                         [id for id, _ in self._similar(recipe)])
+        self.assertEqual(
+            self.client.get('/api/recipes/0/similar/').status_code, 404)
+
+    def test_update_matches_full_rebuild(self):
+        recipe = self.recipes[0]
+        IngredientInRecipe.objects.create(
+            recipe=recipe, ingredient=self.ingredients[4], amount=1)
+        update_similar_recipes(recipe.id)
+        updated = self._similar(recipe)
+        call_command('build_similar_recipes', '--workers', '1',
+                     stdout=StringIO())
+        self.assertEqual([id for id, _ in updated],
+                         [id for id, _ in self._similar(recipe)])
+
+    def test_update_keeps_neighbour_rows(self):
+        recipe, neighbour = self.recipes[1], self.recipes[2]
+        entry = SimilarRecipe.objects.get(recipe=neighbour, similar=recipe)
+        self.assertTrue(SimilarRecipe.objects.filter(
+            recipe=self.recipes[0], similar=recipe).exists())
+        IngredientInRecipe.objects.filter(
+            recipe=recipe, ingredient__in=self.ingredients[1:3]).delete()
+        with CaptureQueriesContext(connection) as context:
+            update_similar_recipes(recipe.id)
+        self.assertFalse(any('GROUP BY' in query['sql']
+                             and 'COUNT' in query['sql']
+                             and 'MIN' not in query['sql']
+                             for query in context.captured_queries))
+        # Строка соседа обновляется на месте, а не пересоздаётся.
+        updated = SimilarRecipe.objects.get(pk=entry.pk)
+        self.assertNotEqual(updated.score, entry.score)
+        # Рецепт без общих ингредиентов удаляется из списка соседа.
+        self.assertFalse(SimilarRecipe.objects.filter(
+            recipe=self.recipes[0], similar=recipe).exists())
+
+    @mock.patch('api.similar.SIMILAR_RECIPES_COUNT', 1)
+    def test_full_lists_trimmed_in_one_statement(self):
+        recipe = self.recipes[0]
+        for ingredient in self.ingredients[3:]:
+            IngredientInRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1)
+        full = SimilarRecipe.objects.exclude(similar=recipe).values(
+            'recipe_id').distinct().count()
+        self.assertGreater(full, 2)
+        with CaptureQueriesContext(connection) as context:
+            update_similar_recipes(recipe.id)
+        # Число запросов не зависит от числа заполненных списков соседей.
+        self.assertEqual(count_statements(context), UPDATE_STATEMENTS)
+        listed = SimilarRecipe.objects.filter(
+            recipe__similar__similar=recipe).exclude(recipe=recipe).values(
+            'recipe_id').annotate(total=Count('id'))
+        self.assertTrue(listed)
+        self.assertTrue(all(row['total'] == 1 for row in listed))
+
+
+class SimilarRecipesTriggerTests(APITestCase):
+    """Пересчёт похожих запускается только при смене тегов и ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='x')
+        cls.tags = [Tags.objects.create(name=f'Тег {i}', slug=f'tag-{i}')
+                    for i in range(2)]
+        cls.ingredients = [
+            Ingredients.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(3)]
+        cls.recipe = Recipes.objects.create(
+            author=cls.author, name='Суп', text='Сварить', cooking_time=30)
+        cls.recipe.tags.set(cls.tags[:1])
+        for ingredient in cls.ingredients[:2]:
+            IngredientInRecipe.objects.create(
+                recipe=cls.recipe, ingredient=ingredient, amount=1)
+        cls.url = f'/api/recipes/{cls.recipe.id}/'
+
+    def setUp(self):
+        self.client.force_authenticate(self.author)
+
+    def _patch(self, tags, ingredients, **fields):
+        with mock.patch(
+                'api.serializers.schedule_similar_update') as schedule:
+            response = self.client.patch(self.url, {
+                'tags': [tag.id for tag in tags],
+                'ingredients': [{'id': ingredient.id, 'amount': amount}
+                                for ingredient, amount in ingredients],
+                **fields}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return schedule.called
+
+    def test_text_and_amounts_do_not_trigger(self):
+        self.assertFalse(self._patch(
+            self.tags[:1], [(ingredient, 5)
+                            for ingredient in self.ingredients[:2]],
+            name='Борщ', text='Сварить иначе'))
+
+    def test_tags_trigger(self):
+        self.assertTrue(self._patch(
+            self.tags, [(ingredient, 1)
+                        for ingredient in self.ingredients[:2]]))
+
+    def test_ingredients_trigger(self):
+        self.assertTrue(self._patch(
+            self.tags[:1], [(ingredient, 1)
+                            for ingredient in self.ingredients[1:]]))
@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipes
+from subscriptions.models import Subscriptions
+
+User = get_user_model()
+
+
+def count_statements(context):
+    return sum(1 for query in context.captured_queries
+               if not query['sql'].startswith(
+                   ('SAVEPOINT', 'RELEASE SAVEPOINT')))
+
+
+class SubscribeTests(APITestCase):
+    """Подписка на автора и отписка от него."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='x')
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user',
+            first_name='Пользователь', last_name='Сайта', password='x')
+        for i in range(4):
+            Recipes.objects.create(author=cls.author, name=f'Рецепт {i}',
+                                   text='Описание', cooking_time=5)
+        cls.url = f'/api/users/{cls.author.id}/subscribe/'
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_subscribe(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(
+                    f'{self.url}?recipes_limit=2')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(count_statements(context), 4)
+        # Лента заполняется в фоне после фиксации, а не в запросе.
+        self.assertEqual(len(callbacks), 1)
+        data = response.json()
+        self.assertEqual(data['id'], self.author.id)
+        self.assertTrue(data['is_subscribed'])
+        self.assertEqual(data['recipes_count'], 4)
+        self.assertEqual(len(data['recipes']), 2)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+
+    def test_subscribe_twice(self):
+        self.client.post(self.url)
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 400)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+
+    def test_subscribe_to_self_or_missing_author(self):
+        response = self.client.post(f'/api/users/{self.user.id}/subscribe/')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/users/0/subscribe/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Subscriptions.objects.exists())
+
+    def test_unsubscribe(self):
+        Subscriptions.objects.add(self.user, self.author.id)
+        with self.captureOnCommitCallbacks() as callbacks:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(count_statements(context), 2)
+        self.assertEqual(len(callbacks), 1)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.delete('/api/users/0/subscribe/')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+User = get_user_model()
+
+
+@override_settings(METRICS_TOKEN='secret', METRICS_ALLOWED_IPS=['10.0.0.1'])
+class MetricsAccessTests(APITestCase):
+    """Метрики и Server-Timing доступны только доверенным клиентам."""
+
+    def test_metrics_forbidden_by_default(self):
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get('/metrics/',
+                                   HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+
+    def test_metrics_from_allowed_address(self):
+        self.client.get('/api/tags/')
+        response = self.client.get('/metrics/', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('foodgram_request_duration_seconds_bucket',
+                      response.content.decode())
+        self.assertIn('view="TagsViewSet.list"', response.content.decode())
+
+    def test_metrics_with_token(self):
+        response = self.client.get('/metrics/',
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_empty_token_never_matches(self):
+        response = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 403)
+
+    def test_server_timing_hidden_from_clients(self):
+        response = self.client.get('/api/tags/')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_server_timing_opt_in(self):
+        response = self.client.get('/api/tags/', HTTP_X_SERVER_TIMING='secret')
+        self.assertIn('db;desc=', response['Server-Timing'])
+        # Справочники кешируются публично, но не с временем запросов.
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+        response = self.client.get('/api/tags/', HTTP_X_SERVER_TIMING='no')
+        self.assertNotIn('Server-Timing', response)
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_server_timing_for_staff(self):
+        staff = User.objects.create_user(
+            email='staff@example.com', username='staff',
+            first_name='Админ', last_name='Сайта', password='x',
+            is_staff=True)
+        self.client.force_authenticate(staff)
+        response = self.client.get('/api/recipes/')
+        self.assertIn('Server-Timing', response)
+
+    @override_settings(DEBUG=True)
+    def test_server_timing_in_debug(self):
+        response = self.client.get('/api/tags/')
+        self.assertIn('Server-Timing', response)
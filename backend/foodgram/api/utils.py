@@ -1,25 +1,117 @@
-from django.db.models import F
+import csv
+from typing import Iterable, Iterator, Optional
 
-from recipes.models import Recipes
+from django.db.models import OuterRef, Prefetch, QuerySet, Subquery, Sum
+
+from recipes.models import IngredientInRecipe, Recipes, ShoppingCart
 
 
 def create_M2M_recipe_field(
         recipe: Recipes, ingredient_id_amount: list) -> None:
-    for ingredient in ingredient_id_amount:
-        recipe.ingredients.add(
-            ingredient.get('id'),
-            through_defaults={'amount': ingredient.get('amount')})
-
-
-def get_shopping_list(recipes: list[Recipes]) -> str:
-    shopping_list = 'Список покупок:\n'
-    data = dict()
-    for recipe in recipes:
-        ingredients = recipe.ingredientinrecipe.annotate(
-            name=F('ingredient__name'),
-            unit=F('ingredient__measurement_unit')).all()
-        for ingredient in ingredients:
-            key = f'{ingredient.name} ({ingredient.unit}) - '
-            data[key] = data.get(key, 0) + ingredient.amount
-    shopping_list += '\n'.join('\t' + k + str(v) for k, v in data.items())
-    return shopping_list
+    IngredientInRecipe.objects.bulk_create(
+        IngredientInRecipe(recipe=recipe,
+                           ingredient_id=ingredient['id'],
+                           amount=ingredient['amount'])
+        for ingredient in ingredient_id_amount)
+
+
+def update_M2M_recipe_field(
+        recipe: Recipes, ingredient_id_amount: list) -> bool:
+    """Приводит ингредиенты рецепта к новому списку по разнице со старым.
+
+    Возвращает True, если изменился набор ингредиентов, а не только
+    их количество.
+    """
+    amounts = {ingredient['id']: ingredient['amount']
+               for ingredient in ingredient_id_amount}
+    current = {ingredient.ingredient_id: ingredient
+               for ingredient in recipe.ingredientinrecipe.all()}
+
+    removed_id = current.keys() - amounts.keys()
+    if removed_id:
+        IngredientInRecipe.objects.filter(
+            recipe=recipe, ingredient_id__in=removed_id).delete()
+
+    changed = []
+    for ingredient_id, ingredient in current.items():
+        amount = amounts.get(ingredient_id)
+        if amount is not None and amount != ingredient.amount:
+            ingredient.amount = amount
+            changed.append(ingredient)
+    if changed:
+        IngredientInRecipe.objects.bulk_update(changed, ('amount',))
+
+    added_id = amounts.keys() - current.keys()
+    create_M2M_recipe_field(recipe, (
+        {'id': ingredient_id, 'amount': amounts[ingredient_id]}
+        for ingredient_id in added_id))
+    return bool(removed_id or added_id)
+
+
+def get_recipes_limit(request) -> Optional[int]:
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit is not None and recipes_limit.isdigit():
+        return int(recipes_limit)
+    return None
+
+
+def limited_recipes(lookup: str, recipes_limit: Optional[int]) -> Prefetch:
+    """Загружает в limited_recipes авторов последние рецепты каждого.
+
+    Последние рецепты каждого автора выбираются коррелированным подзапросом
+    с LIMIT, поэтому число запросов не зависит от числа рецептов.
+    """
+    recipes = Recipes.objects.only(
+        'id', 'author_id', 'name', 'image', 'cooking_time')
+    if recipes_limit is not None:
+        recipes = recipes.filter(id__in=Subquery(
+            Recipes.objects.filter(author=OuterRef('author')).values(
+                'id')[:recipes_limit]))
+    return Prefetch(lookup, queryset=recipes, to_attr='limited_recipes')
+
+
+def with_subscription_recipes(
+        subscriptions: QuerySet, recipes_limit: Optional[int]) -> QuerySet:
+    """Добавляет к подпискам авторов и их последние рецепты."""
+    return subscriptions.select_related('subscription').prefetch_related(
+        limited_recipes('subscription__recipes', recipes_limit))
+
+
+def get_shopping_list(user) -> QuerySet:
+    """Суммирует ингредиенты рецептов из списка покупок одним запросом."""
+    return (IngredientInRecipe.objects
+            .filter(recipe__in=ShoppingCart.objects.filter(
+                user=user).values('recipe'))
+            .values('ingredient__name', 'ingredient__measurement_unit')
+            .annotate(total_amount=Sum('amount'))
+            .order_by('ingredient__name'))
+
+
+def shopping_list_to_txt(ingredients: Iterable[dict]) -> Iterator[str]:
+    yield 'Список покупок:'
+    for ingredient in ingredients:
+        yield (f'\n\t{ingredient["ingredient__name"]} '
+               f'({ingredient["ingredient__measurement_unit"]}) - '
+               f'{ingredient["total_amount"]}')
+
+
+class _Echo():
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_list_to_csv(ingredients: Iterable[dict]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for ingredient in ingredients:
+        yield writer.writerow((ingredient['ingredient__name'],
+                               ingredient['ingredient__measurement_unit'],
+                               ingredient['total_amount']))
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': ('text/plain', shopping_list_to_txt),
+    'csv': ('text/csv', shopping_list_to_csv),
+}
@@ -1,20 +1,43 @@
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import HttpResponse
+from django.db import IntegrityError
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import generics, mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
-from recipes.models import Favorites, Ingredients, Recipes, ShoppingCart, Tags
+from constants import CATALOG_CACHE_MAX_AGE
+from recipes.models import (Favorites, Ingredients, Recipes, ShoppingCart,
+                            SimilarRecipe, Tags)
 from subscriptions.models import Subscriptions
+from .async_views import AsyncViewSetMixin
+from .catalog import (CatalogSnapshot, get_catalog_last_modified,
+                      get_catalog_version)
+from .feed import get_feed_page, schedule_backfill, schedule_clear
 from .filters import RecipeFilterSet
-from .serializers import (FavoritesSerializer, IngredientSerializer,
-                          RecipesSerializer, ShoppingCartSerializer,
+from .pagination import FeedPagination
+from .search import ingredients_index
+from .loaders import get_viewer_relations
+from .serializers import (IngredientSerializer, RecipeReadSerializer,
+                          RecipeShortSerializer, RecipesSerializer,
                           SubscriptionsSerializer, TagSerializer,
                           UserAvatarSerializer)
-from .utils import get_shopping_list
+from .short_links import get_short_link_code
+from .utils import (SHOPPING_LIST_FORMATS, get_recipes_limit,
+                    get_shopping_list, limited_recipes,
+                    with_subscription_recipes)
 
 User = get_user_model()
 
@@ -22,6 +45,8 @@ User = get_user_model()
 class UserViewSet(DjoserUserViewSet):
     """Вьюсет для модели User и подписок пользователей."""
 
+    lookup_value_regex = r'\d+'
+
     def get_permissions(self):
         if self.action == "me" and self.request.method == "GET":
             self.permission_classes = (permissions.IsAuthenticated,)
@@ -29,26 +54,36 @@ class UserViewSet(DjoserUserViewSet):
 
     @action(detail=True, methods=['post', 'delete'])
     def subscribe(self, request, id=None):
-        user = request.user
-        subscription = self.get_object()
-        is_exists = Subscriptions.objects.filter(
-            user=user, subscription=subscription).exists()
+        """Подписывает пользователя на автора или отписывает от него.
 
-        if (request.method == 'POST' and is_exists
-                or request.method == 'DELETE' and not is_exists
-                or user == subscription):
+        Отписка выполняет два запроса: удаление и счётчик подписчиков.
+        Подписка — четыре: автор, вставка, счётчик и последние рецепты
+        автора для ответа. Лента подписчика заполняется и очищается в
+        фоне после фиксации транзакции.
+        """
+        user = request.user
+        if request.method == 'DELETE':
+            if Subscriptions.objects.remove(user, id):
+                schedule_clear(user.id, id)
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            generics.get_object_or_404(User, pk=id)
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        if request.method == 'DELETE':
-            Subscriptions.objects.filter(user=user,
-                                         subscription=subscription).delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        if str(user.id) == id:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        author = generics.get_object_or_404(User, pk=id)
+        try:
+            subscription = Subscriptions.objects.add(user, author.id)
+        except IntegrityError:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        schedule_backfill(user.id, author.id)
 
+        prefetch_related_objects((author,), limited_recipes(
+            'recipes', get_recipes_limit(request)))
+        subscription.subscription = author
+        get_viewer_relations(request).remember('subscriptions', author.id)
         serializer = SubscriptionsSerializer(
-            data={'user': user.id, 'subscription': subscription.id},
-            context={'request': self.request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+            subscription, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
@@ -65,32 +100,100 @@ class UserAvatarView(generics.UpdateAPIView, generics.DestroyAPIView):
     def destroy(self, request):
         instance = self.get_object()
         instance.avatar = None
-        instance.save()
+        instance.save(update_fields=('avatar',))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+def catalog_etag(request, *args, **kwargs):
+    """ETag справочника: версия, формат и сжатие снимка.
+
+    Тела gzip, br и без сжатия различаются побайтно, поэтому у каждого
+    свой сильный ETag.
+    """
+    view = request.parser_context['view']
+    etag = (f'{view.catalog}-{get_catalog_version(view.catalog)}-'
+            f'{request.accepted_renderer.format}')
+    if view.uses_snapshot(request):
+        etag += f'-{view.snapshot.negotiate(request)}'
+    return etag
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return get_catalog_last_modified(request.parser_context['view'].catalog)
+
+
+ingredients_snapshot = CatalogSnapshot('ingredients', lambda: (
+    IngredientSerializer(Ingredients.objects.all(), many=True).data))
+
+catalog_cache = method_decorator((
+    vary_on_headers('Accept-Encoding'),
+    cache_control(public=True, max_age=CATALOG_CACHE_MAX_AGE),
+    condition(etag_func=catalog_etag,
+              last_modified_func=catalog_last_modified),
+))
+
+
+class CatalogCacheMixin():
+    """Миксин условного кеширования справочников по их версии.
+
+    Если клиент прислал актуальные ETag или Last-Modified, ответ 304
+    возвращается без обращения к базе и сериализатору. Если задан
+    snapshot, справочник целиком в JSON отдаётся из готового снимка.
+    """
+
+    catalog = None
+    snapshot = None
+
+    def uses_snapshot(self, request):
+        return (self.snapshot is not None and self.action == 'list'
+                and request.accepted_renderer.format == 'json'
+                and set(request.query_params) <= {'format'})
+
+    @catalog_cache
+    def list(self, request, *args, **kwargs):
+        if self.uses_snapshot(request):
+            return self.snapshot.get_response(request)
+        return super().list(request, *args, **kwargs)
+
+    @catalog_cache
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class TagsViewSet(AsyncViewSetMixin, CatalogCacheMixin,
+                  viewsets.ReadOnlyModelViewSet):
     """Вьюсет для перечисления и извлечения тегов."""
 
+    catalog = 'tags'
+
     queryset = Tags.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (permissions.AllowAny,)
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(AsyncViewSetMixin, CatalogCacheMixin,
+                         viewsets.ReadOnlyModelViewSet):
     """Вьюсет для перечисления и извлечения ингредиентов."""
 
+    catalog = 'ingredients'
+    snapshot = ingredients_snapshot
+    queryset = Ingredients.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (permissions.AllowAny,)
     pagination_class = None
 
-    def get_queryset(self):
-        queryset = Ingredients.objects.all()
+    def filter_queryset(self, queryset):
         search_field = self.request.query_params.get('name', None)
-        if search_field is not None:
-            queryset = queryset.filter(name__startswith=search_field)
-        return queryset
+        if self.action != 'list' or search_field is None:
+            return queryset
+
+        limit = self.request.query_params.get('limit', None)
+        if limit is not None and not limit.isdigit():
+            raise ValidationError(
+                {'limit': 'Должно быть неотрицательным целым числом.'})
+        return ingredients_index.search(
+            search_field, limit=limit and int(limit))
 
 
 class SubscriptionsViewSet(mixins.ListModelMixin,
@@ -100,18 +203,32 @@ class SubscriptionsViewSet(mixins.ListModelMixin,
     serializer_class = SubscriptionsSerializer
 
     def get_queryset(self):
-        return Subscriptions.objects.filter(user=self.request.user)
+        return with_subscription_recipes(
+            Subscriptions.objects.filter(user=self.request.user),
+            get_recipes_limit(self.request)).order_by('id')
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(AsyncViewSetMixin, viewsets.ModelViewSet):
     """Вьюсет для модели Recipes."""
 
-    queryset = Recipes.objects.all().distinct()
+    queryset = Recipes.objects.all()
+    lookup_value_regex = r'\d+'
     serializer_class = RecipesSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilterSet
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            return queryset.values('id', 'author_id')
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'retrieve'):
+            return RecipeReadSerializer
+        return super().get_serializer_class()
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -120,54 +237,86 @@ class RecipesViewSet(viewsets.ModelViewSet):
             return super().destroy(request, args, kwargs)
         return Response(status=status.HTTP_403_FORBIDDEN)
 
-    def _recipe_detail_post_delete(self, request, pk, MODEL, SERIALIZER):
-        user = request.user
-        recipe = self.get_object()
-        is_exists = MODEL.objects.filter(
-            user=user, recipe=recipe).exists()
+    def _recipe_detail_post_delete(self, request, pk, MODEL):
+        """Добавляет рецепт в список пользователя или удаляет из него.
 
-        if (request.method == 'POST' and is_exists
-                or request.method == 'DELETE' and not is_exists):
+        Повторное добавление отсекает ограничение уникальности, а удаление
+        сразу сообщает число удалённых строк. Вместе со строкой списка
+        одним UPDATE меняется счётчик рецепта, поэтому добавление
+        выполняет три запроса к базе (рецепт, вставка, счётчик), а
+        удаление — два (удаление, счётчик).
+        """
+        user = request.user
+        if request.method == 'DELETE':
+            if MODEL.objects.remove(user, pk):
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            generics.get_object_or_404(Recipes, pk=pk)
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        if request.method == 'DELETE':
-            MODEL.objects.filter(user=user, recipe=recipe).delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-
-        serializer = SERIALIZER(
-            data={'user': user.id, 'recipe': recipe.id},
-            context={'request': self.request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        recipe = generics.get_object_or_404(
+            Recipes.objects.only('id', 'name', 'image', 'cooking_time'),
+            pk=pk)
+        try:
+            MODEL.objects.add(user, recipe.id)
+        except IntegrityError:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        serializer = RecipeShortSerializer(
+            recipe, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post', 'delete'])
     def favorite(self, request, pk=None):
-        return self._recipe_detail_post_delete(
-            request, pk, Favorites, FavoritesSerializer)
+        return self._recipe_detail_post_delete(request, pk, Favorites)
 
     @action(detail=True, methods=['post', 'delete'])
     def shopping_cart(self, request, pk=None):
-        return self._recipe_detail_post_delete(
-            request, pk, ShoppingCart, ShoppingCartSerializer)
+        return self._recipe_detail_post_delete(request, pk, ShoppingCart)
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'],
+            permission_classes=(permissions.IsAuthenticated,))
     def download_shopping_cart(self, request, pk=None):
-        user = request.user
-        recipes = [wishlist.recipe for wishlist in user.wishlist_recipes.all()]
-
-        shopping_list = get_shopping_list(recipes)
-        filename = 'shopping_cart.txt'
-        with open(filename, 'w+') as file:
-            file.write(shopping_list)
-        response = HttpResponse(open(filename, 'r').read(),
-                                content_type='text/plain')
-        response[
-            'Content-Disposition'] = 'attachment; filename="shopping_cart.txt"'
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        content_type, to_file = SHOPPING_LIST_FORMATS[file_format]
+        ingredients = get_shopping_list(request.user).iterator()
+        if settings.ASYNC_VIEWS:
+            # ASGI-сервер перебирает тело ответа в цикле событий,
+            # где запросы к базе запрещены.
+            ingredients = list(ingredients)
+        response = StreamingHttpResponse(to_file(ingredients),
+                                         content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{file_format}"')
         return response
 
+    @action(detail=False, methods=['get'],
+            permission_classes=(permissions.IsAuthenticated,),
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        page = self.paginate_queryset(
+            partial(get_feed_page, request.user))
+        serializer = RecipeReadSerializer(
+            page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        similar = SimilarRecipe.objects.filter(recipe_id=pk).order_by(
+            '-score', '-similar_id').values_list(
+            'similar_id', 'similar__author_id')
+        rows = [{'id': id, 'author_id': author_id}
+                for id, author_id in similar]
+        if not rows:
+            generics.get_object_or_404(Recipes.objects.only('id'), pk=pk)
+        serializer = RecipeReadSerializer(
+            rows, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
     @action(detail=True, methods=['get'], url_path='get-link')
     def get_link(self, request, pk=None):
-        path = '/rcp/' + pk + '/'
+        recipe = generics.get_object_or_404(Recipes.objects.only('id'), pk=pk)
+        path = reverse('short-link', args=(get_short_link_code(recipe.id),))
         short_link = request.build_absolute_uri(path)
         return Response({'short-link': short_link})
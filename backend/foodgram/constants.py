@@ -7,3 +7,29 @@ MAX_LENGTH_UNIT: Final = 64
 MAX_LENGTH_RECIPE: Final = 256
 MIN_VALUE_COOKING_TIME: Final = 1
 MIN_VALUE_INGREDIENT_AMOUNT: Final = 1
+CATALOG_CACHE_MAX_AGE: Final = 60
+MAX_IMAGE_SIDE: Final = 5000
+IMAGE_VARIANT_WIDTHS: Final = (320, 640, 1280)
+IMAGE_VARIANT_FORMATS: Final = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+IMAGE_VARIANT_WORKERS: Final = 2
+SHORT_LINK_LENGTH: Final = 6
+SHORT_LINK_CACHE_SIZE: Final = 10000
+SHORT_LINK_FLUSH_INTERVAL: Final = 5
+RECIPE_SEARCH_CONFIG: Final = 'russian'
+RECIPE_CACHE_TIMEOUT: Final = 60 * 60
+RECIPE_CACHE_LOCAL_TIMEOUT: Final = 5
+AUTH_TOKEN_CACHE_SIZE: Final = 10000
+AUTH_TOKEN_CACHE_TIMEOUT: Final = 60
+AUTH_TOKEN_LOCAL_TIMEOUT: Final = 5
+TELEMETRY_DURATION_BUCKETS: Final = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+TELEMETRY_QUERY_BUCKETS: Final = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+FEED_FAN_OUT_LIMIT: Final = 10000
+FEED_FAN_OUT_BATCH_SIZE: Final = 1000
+FEED_BACKFILL_SIZE: Final = 20
+FEED_HUGE_AUTHORS_TIMEOUT: Final = 60
+SIMILAR_RECIPES_COUNT: Final = 10
+SIMILAR_RECIPES_TAG_WEIGHT: Final = 0.3
+SIMILAR_RECIPES_MAX_POSTING: Final = 20000
+SIMILAR_RECIPES_BATCH_SIZE: Final = 256
+SIMILAR_RECIPES_FREQUENCIES_TIMEOUT: Final = 60 * 60
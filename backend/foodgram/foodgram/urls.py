@@ -3,10 +3,15 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
-from .views import short_link
+from api.telemetry import metrics
+from .views import async_short_link, legacy_short_link, short_link
 
 urlpatterns = [
-    path('rcp/<int:recipe_id>/', short_link),
+    path('s/<str:code>/',
+         async_short_link if settings.ASYNC_VIEWS else short_link,
+         name='short-link'),
+    path('rcp/<int:recipe_id>/', legacy_short_link),
+    path('metrics/', metrics),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
 ]
@@ -1,9 +1,31 @@
+from django.http import Http404, HttpResponseNotAllowed
 from django.shortcuts import redirect
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from django.views.decorators.http import require_GET
 
+from api.short_links import aresolve_short_link, resolve_short_link
+from recipes.models import Recipes
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-def short_link(request, recipe_id=None):
+
+@require_GET
+def short_link(request, code):
+    recipe_id = resolve_short_link(code)
+    if recipe_id is None:
+        raise Http404
+    return redirect(f'/recipes/{recipe_id}/')
+
+
+async def async_short_link(request, code):
+    # Декораторы Django 3.2 не поддерживают асинхронные представления.
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(('GET',))
+    recipe_id = await aresolve_short_link(code)
+    if recipe_id is None:
+        raise Http404
+    return redirect(f'/recipes/{recipe_id}/')
+
+
+@require_GET
+def legacy_short_link(request, recipe_id):
+    if not Recipes.objects.filter(pk=recipe_id).exists():
+        raise Http404
     return redirect(f'/recipes/{recipe_id}/')
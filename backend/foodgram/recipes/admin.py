@@ -1,13 +1,15 @@
 from django.contrib import admin
 from django.utils.safestring import mark_safe
 
+from api.similar import schedule_similar_update
 from .models import (Favorites, IngredientInRecipe, Ingredients, Recipes,
-                     ShoppingCart, Tags)
+                     ShoppingCart, ShortLink, Tags)
 
 
 @admin.register(Tags)
 class TagsAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug', 'id')
+    search_fields = ('name', 'slug')
 
 
 @admin.register(Ingredients)
@@ -18,6 +20,7 @@ class IngredientsAdmin(admin.ModelAdmin):
 
 class IngredientInRecipeInline(admin.TabularInline):
     model = IngredientInRecipe
+    autocomplete_fields = ('ingredient',)
     min_num = 1
     extra = 0
 
@@ -28,25 +31,76 @@ class RecipesAdmin(admin.ModelAdmin):
     fields = ('author', 'name', 'text', 'image', 'preview',
               'cooking_time', 'tags')
     readonly_fields = ('preview',)
-    search_fields = ('name', 'author',)
-    filter_fields = ('tags',)
-    filter_horizontal = ('tags', 'ingredients')
+    list_select_related = ('author',)
+    search_fields = ('name', '=author__username')
+    show_full_result_count = False
+    autocomplete_fields = ('author', 'tags')
     inlines = (IngredientInRecipeInline,)
 
-    @admin.display(description="В списке избранных")
+    @admin.display(description="В списке избранных",
+                   ordering='favorites_count')
     def in_favorites_count(self, obj, verbose_name='Рецепт'):
-        return obj.users.count()
+        return obj.favorites_count
 
     def preview(self, obj):
         return mark_safe(
             f'<img src="{obj.image.url}" style="max-height: 200px;">')
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if not change or 'tags' in form.changed_data or any(
+                formset.new_objects or formset.deleted_objects or any(
+                    'ingredient' in fields
+                    for _, fields in formset.changed_objects)
+                for formset in formsets):
+            schedule_similar_update(form.instance)
+
+
+class CountedRelationAdmin(admin.ModelAdmin):
+    """Админка связей, меняющая счётчик связанного объекта вместе с ними.
+
+    Связи можно добавлять и удалять, но не изменять: при смене объекта
+    связи его счётчик разошёлся бы с числом строк.
+    """
+
+    show_full_result_count = False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def _target_id(self, obj):
+        field, _ = obj.counter
+        return getattr(obj, f'{field}_id')
+
+    def save_model(self, request, obj, form, change):
+        obj.pk = type(obj).objects.add(obj.user, self._target_id(obj)).pk
+
+    def delete_model(self, request, obj):
+        type(obj).objects.remove(obj.user, self._target_id(obj))
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.delete_model(request, obj)
+
 
 @admin.register(Favorites)
-class FavoritesAdmin(admin.ModelAdmin):
+class FavoritesAdmin(CountedRelationAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('user', 'recipe')
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(CountedRelationAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('user', 'recipe')
+
+
+@admin.register(ShortLink)
+class ShortLinkAdmin(admin.ModelAdmin):
+    list_display = ('code', 'recipe', 'hits')
+    list_select_related = ('recipe',)
+    raw_id_fields = ('recipe',)
+    search_fields = ('=code',)
+    show_full_result_count = False
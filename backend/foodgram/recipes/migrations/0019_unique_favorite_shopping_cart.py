@@ -0,0 +1,39 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:15
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicates(apps, schema_editor):
+    for model_name in ('Favorites', 'ShoppingCart'):
+        model = apps.get_model('recipes', model_name)
+        keep_ids = model.objects.values('user', 'recipe').annotate(
+            keep_id=Min('id')).values('keep_id')
+        model.objects.exclude(id__in=keep_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_recipe_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='favorites',
+            name='favorites_user_recipe_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='shoppingcart',
+            name='shoppingcart_user_recipe_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='favorites',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_cart'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:17
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    recipes = apps.get_model('recipes', 'Recipes')
+    user = apps.get_model('users', 'FoodgramUserInterface')
+    recipes.objects.update(
+        favorites_count=count_subquery(
+            apps.get_model('recipes', 'Favorites'), 'recipe'),
+        shopping_cart_count=count_subquery(
+            apps.get_model('recipes', 'ShoppingCart'), 'recipe'))
+    user.objects.update(
+        recipes_count=count_subquery(recipes, 'author'),
+        followers_count=count_subquery(
+            apps.get_model('subscriptions', 'Subscriptions'), 'subscription'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_unique_favorite_shopping_cart'),
+        ('subscriptions', '0003_auto_20250314_1516'),
+        ('users', '0004_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipes',
+            name='shopping_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipes_popularity_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
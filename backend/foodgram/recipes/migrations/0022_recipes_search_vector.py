@@ -0,0 +1,43 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:30
+
+from django.db import migrations
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian'::regconfig, coalesce(name, '')), 'A')"
+    " || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(text, '')), 'B')"
+)
+
+
+def add_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = schema_editor.quote_name(
+        apps.get_model('recipes', 'Recipes')._meta.db_table)
+    schema_editor.execute(
+        f'ALTER TABLE {table} ADD COLUMN search_vector tsvector '
+        f'GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED')
+    schema_editor.execute(
+        f'CREATE INDEX recipes_search_vector_idx ON {table} '
+        f'USING gin (search_vector)')
+
+
+def remove_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = schema_editor.quote_name(
+        apps.get_model('recipes', 'Recipes')._meta.db_table)
+    schema_editor.execute('DROP INDEX IF EXISTS recipes_search_vector_idx')
+    schema_editor.execute(
+        f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0021_shortlink'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_vector, remove_search_vector),
+    ]
@@ -1,10 +1,12 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 
 from constants import (MAX_LENGTH_INGREDIENT, MAX_LENGTH_RECIPE,
                        MAX_LENGTH_TAG, MAX_LENGTH_UNIT, MIN_VALUE_COOKING_TIME,
-                       MIN_VALUE_INGREDIENT_AMOUNT)
+                       MIN_VALUE_INGREDIENT_AMOUNT, SHORT_LINK_LENGTH)
+from users.models import CounterFieldsMixin
 
 User = get_user_model()
 
@@ -54,7 +56,7 @@ class Ingredients(SelfNameMixin, models.Model):
         ordering = ('name',)
 
 
-class Recipes(SelfNameMixin, models.Model):
+class Recipes(CounterFieldsMixin, SelfNameMixin, models.Model):
     """Модель для хранения рецептов."""
 
     author = models.ForeignKey(
@@ -72,6 +74,11 @@ class Recipes(SelfNameMixin, models.Model):
         verbose_name='Изображение',
         null=True,
         default=None)
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии изображения',
+        default=dict,
+        blank=True,
+        editable=False)
     cooking_time = models.IntegerField(
         verbose_name='Время приготовления (мин.)',
         validators=(MinValueValidator(MIN_VALUE_COOKING_TIME),))
@@ -82,11 +89,26 @@ class Recipes(SelfNameMixin, models.Model):
         Ingredients,
         through='IngredientInRecipe',
         verbose_name='Ингредиенты')
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False)
+    shopping_cart_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False)
+    counter_fields = ('favorites_count', 'shopping_cart_count')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-id',)
+        indexes = (
+            models.Index(fields=('author', '-id'),
+                         name='recipes_author_id_idx'),
+            models.Index(fields=('-favorites_count', '-id'),
+                         name='recipes_popularity_idx'),
+        )
 
 
 class IngredientInRecipe(models.Model):
@@ -113,6 +135,42 @@ class IngredientInRecipe(models.Model):
         verbose_name_plural = 'Ингрединеты'
 
 
+class CountedRelationQuerySet(models.QuerySet):
+    """Связи пользователя с объектом, у которого есть счётчик таких связей.
+
+    Модель задаёт counter — пару из имени внешнего ключа на объект и имени
+    поля счётчика. add и remove меняют строку связи и счётчик в одной
+    транзакции одним UPDATE с F(). Сигналы для счётчиков не используются:
+    обработчик post_delete отключил бы быстрое удаление одним DELETE.
+    """
+
+    def _change_counter(self, target_id: int, delta: int) -> None:
+        field, counter = self.model.counter
+        targets = self.model._meta.get_field(
+            field).related_model._default_manager.filter(pk=target_id)
+        if delta < 0:
+            targets = targets.filter(**{f'{counter}__gt': 0})
+        targets.update(**{counter: F(counter) + delta})
+
+    def add(self, user, target_id: int) -> models.Model:
+        """Создаёт связь; повторная связь вызывает IntegrityError."""
+        field, _ = self.model.counter
+        with transaction.atomic():
+            relation = self.create(user=user, **{f'{field}_id': target_id})
+            self._change_counter(target_id, 1)
+        return relation
+
+    def remove(self, user, target_id: int) -> bool:
+        """Удаляет связь и сообщает, существовала ли она."""
+        field, _ = self.model.counter
+        with transaction.atomic():
+            deleted, _ = self.filter(
+                user=user, **{f'{field}_id': target_id}).delete()
+            if deleted:
+                self._change_counter(target_id, -1)
+        return bool(deleted)
+
+
 class Favorites(models.Model):
     """Модель для хранения избранных рецептов пользователя."""
 
@@ -127,9 +185,16 @@ class Favorites(models.Model):
         related_name='users',
         verbose_name='Рецепт')
 
+    counter = ('recipe', 'favorites_count')
+    objects = CountedRelationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'), name='unique_favorite'),
+        )
 
 
 class ShoppingCart(models.Model):
@@ -146,6 +211,67 @@ class ShoppingCart(models.Model):
         related_name='+',
         verbose_name='Рецепт')
 
+    counter = ('recipe', 'shopping_cart_count')
+    objects = CountedRelationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Список покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'), name='unique_shopping_cart'),
+        )
+
+
+class ShortLink(models.Model):
+    """Модель короткой ссылки на рецепт."""
+
+    code = models.CharField(
+        max_length=SHORT_LINK_LENGTH,
+        unique=True,
+        verbose_name='Код')
+    recipe = models.OneToOneField(
+        Recipes,
+        on_delete=models.CASCADE,
+        related_name='short_link',
+        verbose_name='Рецепт')
+    hits = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Переходы')
+
+    class Meta:
+        verbose_name = 'Короткая ссылка'
+        verbose_name_plural = 'Короткие ссылки'
+
+    def __str__(self):
+        return self.code
+
+
+class SimilarRecipe(models.Model):
+    """Модель похожего рецепта, рассчитанного заранее."""
+
+    recipe = models.ForeignKey(
+        Recipes,
+        on_delete=models.CASCADE,
+        related_name='similar',
+        verbose_name='Рецепт')
+    similar = models.ForeignKey(
+        Recipes,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт')
+    score = models.FloatField(
+        verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'], name='unique_similar_recipe'),
+        ]
+        indexes = [
+            models.Index(fields=['recipe', '-score'],
+                         name='similar_recipe_score_idx'),
+        ]
@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Favorites, Recipes, ShoppingCart
+
+User = get_user_model()
+
+
+@receiver(pre_delete, sender=User)
+def release_recipe_counters(instance, **kwargs):
+    """Уменьшает счётчики рецептов из списков удаляемого пользователя.
+
+    Строки списков удаляются каскадом без сигналов, поэтому счётчики
+    поправляются заранее: по одному UPDATE на счётчик.
+    """
+    for model in (Favorites, ShoppingCart):
+        field, counter = model.counter
+        Recipes.objects.filter(
+            pk__in=model.objects.filter(user=instance).values(field),
+            **{f'{counter}__gt': 0}).update(**{counter: F(counter) - 1})
+
+
+@receiver(post_save, sender=Recipes)
+def increase_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1)
+
+
+@receiver(post_delete, sender=Recipes)
+def decrease_recipes_count(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.author_id, recipes_count__gt=0).update(
+        recipes_count=F('recipes_count') - 1)
@@ -0,0 +1,126 @@
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Откатывает базу к migrate_from и проверяет переход к migrate_to.
+
+    Исторические модели состояния до миграции доступны в self.apps.
+    После теста база возвращается к последним миграциям.
+    """
+
+    migrate_from = None
+    migrate_to = None
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        self.apps = self._migrate(self.migrate_from)
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        self.apps = self._migrate(self.migrate_to)
+
+    def create_user(self, name):
+        return self.apps.get_model(
+            'users', 'FoodgramUserInterface').objects.create(
+            username=name, email=f'{name}@example.com',
+            first_name='Имя', last_name='Фамилия')
+
+    def create_recipe(self, author, name='Суп'):
+        return self.apps.get_model('recipes', 'Recipes').objects.create(
+            author_id=author.pk, name=name, text='Сварить', cooking_time=30,
+            image='recipes/image/soup.jpg')
+
+
+class UniqueFavoriteMigrationTests(MigrationTestCase):
+    """Миграция 0019 убирает дубли избранного и списка покупок."""
+
+    migrate_from = [('recipes', '0018_recipe_filter_indexes'),
+                    ('users', '0005_username_upper_index')]
+    migrate_to = [('recipes', '0019_unique_favorite_shopping_cart'),
+                  ('users', '0005_username_upper_index')]
+
+    def test_duplicates_removed_and_forbidden(self):
+        user = self.create_user('user')
+        recipe = self.create_recipe(self.create_user('author'))
+        for model_name in ('Favorites', 'ShoppingCart'):
+            model = self.apps.get_model('recipes', model_name)
+            for _ in range(3):
+                model.objects.create(user_id=user.pk, recipe_id=recipe.pk)
+
+        self.migrate()
+        for model_name in ('Favorites', 'ShoppingCart'):
+            model = self.apps.get_model('recipes', model_name)
+            with self.subTest(model=model_name):
+                self.assertEqual(model.objects.count(), 1)
+                with self.assertRaises(IntegrityError):
+                    model.objects.create(user_id=user.pk,
+                                         recipe_id=recipe.pk)
+
+
+class RecipeCountersMigrationTests(MigrationTestCase):
+    """Миграция 0020 заполняет счётчики по существующим строкам."""
+
+    migrate_from = [('recipes', '0019_unique_favorite_shopping_cart'),
+                    ('subscriptions', '0003_auto_20250314_1516'),
+                    ('users', '0005_username_upper_index')]
+    migrate_to = [('recipes', '0020_recipe_counters'),
+                  ('subscriptions', '0003_auto_20250314_1516'),
+                  ('users', '0005_username_upper_index')]
+
+    def test_counters_filled(self):
+        author = self.create_user('author')
+        recipe = self.create_recipe(author)
+        self.create_recipe(author, 'Борщ')
+        favorites = self.apps.get_model('recipes', 'Favorites')
+        subscriptions = self.apps.get_model('subscriptions', 'Subscriptions')
+        for name in ('first', 'second'):
+            user = self.create_user(name)
+            favorites.objects.create(user_id=user.pk, recipe_id=recipe.pk)
+            subscriptions.objects.create(user_id=user.pk,
+                                         subscription_id=author.pk)
+        self.apps.get_model('recipes', 'ShoppingCart').objects.create(
+            user_id=author.pk, recipe_id=recipe.pk)
+
+        self.migrate()
+        recipe = self.apps.get_model('recipes', 'Recipes').objects.get(
+            pk=recipe.pk)
+        author = self.apps.get_model(
+            'users', 'FoodgramUserInterface').objects.get(pk=author.pk)
+        self.assertEqual(
+            (recipe.favorites_count, recipe.shopping_cart_count), (2, 1))
+        self.assertEqual(
+            (author.recipes_count, author.followers_count), (2, 2))
+
+
+class SimilarRecipeMigrationTests(MigrationTestCase):
+    """Миграция 0023 создаёт таблицу похожих с уникальной парой."""
+
+    migrate_from = [('recipes', '0022_recipes_search_vector'),
+                    ('users', '0005_username_upper_index')]
+    migrate_to = [('recipes', '0023_similarrecipe'),
+                  ('users', '0005_username_upper_index')]
+
+    def test_pair_is_unique(self):
+        author = self.create_user('author')
+        recipe = self.create_recipe(author)
+        similar = self.create_recipe(author, 'Борщ')
+
+        self.migrate()
+        model = self.apps.get_model('recipes', 'SimilarRecipe')
+        model.objects.create(recipe_id=recipe.pk, similar_id=similar.pk,
+                             score=0.5)
+        model.objects.create(recipe_id=similar.pk, similar_id=recipe.pk,
+                             score=0.5)
+        with self.assertRaises(IntegrityError):
+            model.objects.create(recipe_id=recipe.pk, similar_id=similar.pk,
+                                 score=0.7)
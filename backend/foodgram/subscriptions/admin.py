@@ -1,8 +1,20 @@
 from django.contrib import admin
 
+from api.feed import schedule_backfill, schedule_clear
+from recipes.admin import CountedRelationAdmin
 from .models import Subscriptions
 
 
 @admin.register(Subscriptions)
-class SubscriptionsAdmin(admin.ModelAdmin):
+class SubscriptionsAdmin(CountedRelationAdmin):
     list_display = ('user', 'subscription',)
+    list_select_related = ('user', 'subscription')
+    raw_id_fields = ('user', 'subscription')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        schedule_backfill(obj.user_id, obj.subscription_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        schedule_clear(obj.user_id, obj.subscription_id)
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from recipes.models import CountedRelationQuerySet, Recipes
+
 User = get_user_model()
 
 
@@ -18,6 +20,9 @@ class Subscriptions(models.Model):
         verbose_name='Подписка',
         related_name='+')
 
+    counter = ('subscription', 'followers_count')
+    objects = CountedRelationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
@@ -28,3 +33,40 @@ class Subscriptions(models.Model):
 
     def __str__(self):
         return f'{self.user.username} - {self.subscription.username}'
+
+
+class TimelineEntry(models.Model):
+    """Модель записи ленты: новый рецепт автора у его подписчика.
+
+    Записи создаются при публикации рецепта для всех подписчиков автора,
+    кроме авторов с очень большим числом подписчиков: их рецепты
+    добавляются в ленту при чтении.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик')
+    recipe = models.ForeignKey(
+        Recipes,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
@@ -0,0 +1,17 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from .models import Subscriptions
+
+User = get_user_model()
+
+
+@receiver(pre_delete, sender=User)
+def release_followers_counters(instance, **kwargs):
+    """Уменьшает число подписчиков авторов удаляемого пользователя."""
+    User.objects.filter(
+        pk__in=Subscriptions.objects.filter(user=instance).values(
+            'subscription'), followers_count__gt=0).update(
+        followers_count=F('followers_count') - 1)
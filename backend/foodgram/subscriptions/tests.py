@@ -0,0 +1,33 @@
+from django.db import IntegrityError, transaction
+
+from recipes.tests import MigrationTestCase
+
+
+class TimelineMigrationTests(MigrationTestCase):
+    """Миграция 0004 создаёт ленты с уникальной записью на рецепт."""
+
+    migrate_from = [('subscriptions', '0003_auto_20250314_1516'),
+                    ('recipes', '0023_similarrecipe'),
+                    ('users', '0005_username_upper_index')]
+    migrate_to = [('subscriptions', '0004_timelineentry'),
+                  ('recipes', '0023_similarrecipe'),
+                  ('users', '0005_username_upper_index')]
+
+    def test_unique_constraints(self):
+        author, user = self.create_user('author'), self.create_user('user')
+        recipe = self.create_recipe(author)
+        subscriptions = self.apps.get_model('subscriptions', 'Subscriptions')
+        subscriptions.objects.create(user_id=user.pk,
+                                     subscription_id=author.pk)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            subscriptions.objects.create(user_id=user.pk,
+                                         subscription_id=author.pk)
+
+        self.migrate()
+        entries = self.apps.get_model('subscriptions', 'TimelineEntry')
+        entries.objects.create(user_id=user.pk, recipe_id=recipe.pk,
+                               author_id=author.pk)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            entries.objects.create(user_id=user.pk, recipe_id=recipe.pk,
+                                   author_id=author.pk)
+        self.assertEqual(entries.objects.count(), 1)
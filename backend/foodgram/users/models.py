@@ -1,10 +1,36 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Upper
 
 from constants import MAX_LENGTH_EMAIL
 
 
-class FoodgramUserInterface(AbstractUser):
+class CounterFieldsMixin():
+    """Миксин, исключающий счётчики из обычного сохранения модели.
+
+    Счётчики из counter_fields меняются атомарным UPDATE с F(), поэтому
+    save() без update_fields не записывает их значения, прочитанные в
+    начале запроса, поверх изменений конкурентных запросов. Чтобы
+    сохранить счётчик, его нужно явно указать в update_fields.
+    """
+
+    counter_fields = ()
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        if (update_fields is None and not force_insert
+                and not self._state.adding):
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred]
+        super().save(force_insert=force_insert, force_update=force_update,
+                     using=using, update_fields=update_fields)
+
+
+class FoodgramUserInterface(CounterFieldsMixin, AbstractUser):
     """Пользовательская модель для пользователей."""
 
     email = models.EmailField(
@@ -15,6 +41,15 @@ class FoodgramUserInterface(AbstractUser):
         upload_to='users/avatar/',
         null=True,
         default=None)
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Число рецептов',
+        default=0,
+        editable=False)
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Число подписчиков',
+        default=0,
+        editable=False)
+    counter_fields = ('recipes_count', 'followers_count')
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
@@ -24,3 +59,6 @@ class FoodgramUserInterface(AbstractUser):
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
+        indexes = (
+            models.Index(Upper('username'), name='users_username_upper_idx'),
+        )